@@ -0,0 +1,144 @@
+import argparse
+import logging
+import time
+
+from kvsqlite.sqlite import Sqlite, REQUEST
+from kvsqlite.encoders import PickleEncoder
+
+parser = argparse.ArgumentParser(description="Benchmark kvsqlite request dispatch")
+parser.add_argument(
+    "--query-count",
+    type=int,
+    help="Number of queryies to benchmark (Defaults to 1000000)",
+    default=1000000,
+)
+args = parser.parse_args()
+
+if args.query_count < 1:
+    raise ValueError("--query-count must be greater than 1")
+
+logger = logging.getLogger(__name__)
+
+PINK = "\033[95m"
+GREEN = "\033[92m"
+WARNING = "\033[93m"
+ENDC = "\033[0m"
+
+# The order of the if/elif chain used before the handler table
+CHAIN = [
+    REQUEST.GET,
+    REQUEST.SET,
+    REQUEST.SETEX,
+    REQUEST.DELETE,
+    REQUEST.COMMIT,
+    REQUEST.EXISTS,
+    REQUEST.TTL,
+    REQUEST.EXPIRE,
+    REQUEST.RENAME,
+    REQUEST.KEYS,
+    REQUEST.CLEAN_EX,
+    REQUEST.FLUSH_DB,
+    REQUEST.CLOSE,
+]
+
+
+def handler(key, value):
+    return None
+
+
+def chain_dispatch(request, key=None, value=None):
+    logger.debug("Request={}, key={}".format(request, key))
+
+    if request == REQUEST.GET:
+        return handler(key, value)
+    elif request == REQUEST.SET:
+        return handler(key, value)
+    elif request == REQUEST.SETEX:
+        return handler(key, value)
+    elif request == REQUEST.DELETE:
+        return handler(key, value)
+    elif request == REQUEST.COMMIT:
+        return handler(key, value)
+    elif request == REQUEST.EXISTS:
+        return handler(key, value)
+    elif request == REQUEST.TTL:
+        return handler(key, value)
+    elif request == REQUEST.EXPIRE:
+        return handler(key, value)
+    elif request == REQUEST.RENAME:
+        return handler(key, value)
+    elif request == REQUEST.KEYS:
+        return handler(key, value)
+    elif request == REQUEST.CLEAN_EX:
+        return handler(key, value)
+    elif request == REQUEST.FLUSH_DB:
+        return handler(key, value)
+    elif request == REQUEST.CLOSE:
+        return handler(key, value)
+    else:
+        raise ValueError("Unknown request {}".format(request))
+
+
+HANDLERS = {request: handler for request in CHAIN}
+
+
+def table_dispatch(request, key=None, value=None):
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Request={}, key={}".format(request, key))
+
+    handler = HANDLERS.get(request)
+    if handler is None:
+        raise ValueError("Unknown request {}".format(request))
+
+    return handler(key, value)
+
+
+def benchmark(name, function, request):
+    start = time.perf_counter()
+    for _ in range(args.query_count):
+        function(request, "key")
+    took = time.perf_counter() - start
+
+    print(
+        WARNING,
+        "-> {} {}:{} {} ns/op".format(
+            name, request, ENDC, int(took / args.query_count * 1e9)
+        ),
+    )
+    return took
+
+
+def main():
+    print(PINK, "================Benchmark dispatch===========", ENDC)
+    for request in (REQUEST.GET, REQUEST.CLOSE):
+        chain = benchmark("if/elif chain", chain_dispatch, request)
+        table = benchmark("handler table", table_dispatch, request)
+        print(
+            WARNING,
+            "-> Overhead reduction:",
+            ENDC,
+            "{:.1f}%".format((1 - table / chain) * 100),
+        )
+    print(GREEN, "================Benchmark end================", ENDC)
+    print()
+
+    print(PINK, "================Benchmark procces_request====", ENDC)
+    sqlite = Sqlite(":memory:", "kvsqlite", True, "WAL", "NORMAL", PickleEncoder(), 1)
+    sqlite.execute(REQUEST.SET, "key", "value")
+    for request in (REQUEST.GET, REQUEST.EXISTS, REQUEST.TTL):
+        start = time.perf_counter()
+        for _ in range(args.query_count):
+            sqlite.procces_request(request, "key")
+        took = time.perf_counter() - start
+        print(
+            WARNING,
+            "-> {}:{} {} ns/op".format(
+                request, ENDC, int(took / args.query_count * 1e9)
+            ),
+        )
+    sqlite.execute(REQUEST.CLOSE, value=False)
+    print(GREEN, "================Benchmark end================", ENDC)
+    print()
+
+
+main()
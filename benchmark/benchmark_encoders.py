@@ -0,0 +1,101 @@
+import argparse
+import random
+import string
+import time
+
+from kvsqlite import (
+    PickleEncoder,
+    StringEncoder,
+    BytesEncoder,
+    JSONEncoder,
+    CompressedEncoder,
+)
+
+parser = argparse.ArgumentParser(description="Benchmark kvsqlite encoders")
+parser.add_argument(
+    "--query-count",
+    type=int,
+    help="Number of encode/decode rounds per payload (Defaults to 100000)",
+    default=100000,
+)
+args = parser.parse_args()
+
+if args.query_count < 1:
+    raise ValueError("--query-count must be greater than 1")
+
+
+def random_string(length):
+    return "".join(random.choice(string.ascii_letters) for _ in range(length))
+
+
+PINK = "\033[95m"
+GREEN = "\033[92m"
+WARNING = "\033[93m"
+ENDC = "\033[0m"
+
+PAYLOADS = {
+    "short str": random_string(32),
+    "long str": random_string(16384),
+    "bytes": random.randbytes(16384),
+    "session dict": {
+        "user_id": 123456789,
+        "username": random_string(12),
+        "email": "{}@example.com".format(random_string(8)),
+        "roles": ["user", "editor"],
+        "active": True,
+        "preferences": {"theme": "dark", "language": "en", "notifications": True},
+        "history": [random_string(20) for _ in range(50)],
+    },
+}
+
+# Encoders and the payloads they support
+ENCODERS = {
+    "PickleEncoder": (PickleEncoder(), PAYLOADS.keys()),
+    "StringEncoder": (StringEncoder(), ["short str", "long str"]),
+    "BytesEncoder": (BytesEncoder(), ["bytes"]),
+    "JSONEncoder": (JSONEncoder(), ["short str", "long str", "session dict"]),
+    "CompressedEncoder(PickleEncoder)": (CompressedEncoder(), PAYLOADS.keys()),
+}
+
+
+def benchmark_encoder(name, encoder, payloads):
+    print(PINK, "================Benchmark {}".format(name), ENDC)
+
+    for payload_name in payloads:
+        payload = PAYLOADS[payload_name]
+
+        start = time.perf_counter()
+        for _ in range(args.query_count):
+            encoded = encoder.encode(payload)
+        encode_took = time.perf_counter() - start
+
+        # sqlite3 returns blobs as bytes
+        encoded = bytes(encoded)
+        start = time.perf_counter()
+        for _ in range(args.query_count):
+            encoder.decode(encoded)
+        decode_took = time.perf_counter() - start
+
+        assert encoder.decode(encoded) == payload
+
+        print(
+            WARNING,
+            "-> {}:{} encode {} ns/op, decode {} ns/op, size {}".format(
+                payload_name,
+                ENDC,
+                int(encode_took / args.query_count * 1e9),
+                int(decode_took / args.query_count * 1e9),
+                len(encoded),
+            ),
+        )
+
+    print(GREEN, "================Benchmark end================", ENDC)
+    print()
+
+
+def main():
+    for name, (encoder, payloads) in ENCODERS.items():
+        benchmark_encoder(name, encoder, payloads)
+
+
+main()
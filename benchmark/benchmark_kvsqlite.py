@@ -20,6 +20,12 @@ parser.add_argument(
     help="Databse path (Defaults to benchmark_kvsqlite.sqlite)",
     default="benchmark_kvsqlite.sqlite",
 )
+parser.add_argument(
+    "--pragmas",
+    type=str,
+    help="Pragmas preset, e.g. read-heavy (Defaults to None)",
+    default=None,
+)
 args = parser.parse_args()
 
 if args.query_count < 1:
@@ -472,7 +478,7 @@ async def main():
             )
         )
 
-    async with kvsqlite.Client(args.db_path) as db:
+    async with kvsqlite.Client(args.db_path, pragmas=args.pragmas) as db:
         print(WARNING, args.query_count, "Query benchmark", ENDC)
         await benchmark_set(db, keys)
         await benchmark_get(db, keys)
@@ -481,7 +487,7 @@ async def main():
 
         await db.flush()
 
-    async with kvsqlite.Client(args.db_path) as db:
+    async with kvsqlite.Client(args.db_path, pragmas=args.pragmas) as db:
         await benchmark_setex(db, keys)
         await benchmark_get(db, keys)
         await benchmark_ttl(db, keys)
@@ -489,11 +495,13 @@ async def main():
 
         await db.flush()
 
-    async with kvsqlite.Client(args.db_path, autocommit=False) as db:
+    async with kvsqlite.Client(
+        args.db_path, pragmas=args.pragmas, autocommit=False
+    ) as db:
         await benchmark_no_auto_commit_set(db, keys)
         await db.flush()
 
-    async with kvsqlite.Client(args.db_path, workers=5) as db:
+    async with kvsqlite.Client(args.db_path, pragmas=args.pragmas, workers=5) as db:
         print(
             WARNING,
             args.query_count,
@@ -507,5 +515,19 @@ async def main():
 
         await db.flush()
 
+    async with kvsqlite.Client(
+        args.db_path, pragmas=args.pragmas, queue_engine=True
+    ) as db:
+        print(
+            WARNING,
+            args.query_count,
+            "Query benchmark with the queue engine",
+            ENDC,
+        )
+        await benchmark_concurrent_set(db, keys)
+        await benchmark_concurrent_get(db, keys)
+
+        await db.flush()
+
 
 asyncio.run(main())
@@ -0,0 +1,115 @@
+import argparse
+import os
+import random
+import sqlite3
+import string
+import time
+
+parser = argparse.ArgumentParser(
+    description="Benchmark kvsqlite schema versions (write throughput and file size)"
+)
+parser.add_argument(
+    "--query-count",
+    type=int,
+    help="Number of queryies to benchmark (Defaults to 100000)",
+    default=100000,
+)
+parser.add_argument(
+    "--db-path",
+    type=str,
+    help="Databse path (Defaults to benchmark_schema.sqlite)",
+    default="benchmark_schema.sqlite",
+)
+args = parser.parse_args()
+
+if args.query_count < 1:
+    raise ValueError("--query-count must be greater than 1")
+
+
+def random_string(length):
+    return "".join(random.choice(string.ascii_letters) for _ in range(length))
+
+
+PINK = "\033[95m"
+GREEN = "\033[92m"
+WARNING = "\033[93m"
+ENDC = "\033[0m"
+
+TABLE = 'CREATE TABLE "kvsqlite" (k VARCHAR(4096) PRIMARY KEY, v BLOB, expire_time INTEGER DEFAULT NULL) WITHOUT ROWID'
+
+SCHEMAS = {
+    "version 0 (idx_lookup)": [
+        TABLE,
+        'CREATE INDEX idx_lookup ON "kvsqlite" (k, expire_time)',
+    ],
+    "version 1 (expire_time partial index)": [
+        TABLE,
+        'CREATE INDEX "kvsqlite_expire_time" ON "kvsqlite" (expire_time) WHERE expire_time IS NOT NULL',
+    ],
+}
+
+
+def remove_database():
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.db_path + suffix):
+            os.remove(args.db_path + suffix)
+
+
+def benchmark_schema(name, statements, keys):
+    print(PINK, "================Benchmark {}".format(name), ENDC)
+    remove_database()
+
+    connection = sqlite3.connect(args.db_path, isolation_level=None)
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    for statement in statements:
+        connection.execute(statement)
+
+    start = time.perf_counter()
+    for k, v in keys:
+        connection.execute(
+            'REPLACE INTO "kvsqlite" (k, v, expire_time) VALUES(?,?,NULL)', (k, v)
+        )
+    took = time.perf_counter() - start
+
+    connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    connection.close()
+    size = os.path.getsize(args.db_path)
+
+    print(
+        WARNING,
+        "-> {} query took:{} {}".format(args.query_count, ENDC, took),
+    )
+    print(
+        WARNING,
+        "-> QRS:",
+        ENDC,
+        int(args.query_count / took),
+    )
+    print(
+        WARNING,
+        "-> Database size:",
+        ENDC,
+        size,
+    )
+    print(GREEN, "================Benchmark end================", ENDC)
+    print()
+
+    remove_database()
+
+
+def main():
+    keys = []
+    for _ in range(args.query_count):
+        keys.append(
+            (
+                random_string(random.randint(1, 20)),
+                random_string(random.randint(1, 20)).encode(),
+            )
+        )
+
+    for name, statements in SCHEMAS.items():
+        benchmark_schema(name, statements, keys)
+
+
+main()
@@ -4,8 +4,26 @@ __license__ = "MIT License"
 
 VERSION = __version__
 
-__all__ = ["Client", "PickleEncoder", "StringEncoder", "sync"]
+__all__ = [
+    "Client",
+    "ShardedClient",
+    "NativeEncoder",
+    "PickleEncoder",
+    "StringEncoder",
+    "BytesEncoder",
+    "JSONEncoder",
+    "CompressedEncoder",
+    "sync",
+]
 
 from .client import Client
-from .encoders import PickleEncoder, StringEncoder
+from .sharded import ShardedClient
+from .encoders import (
+    NativeEncoder,
+    PickleEncoder,
+    StringEncoder,
+    BytesEncoder,
+    JSONEncoder,
+    CompressedEncoder,
+)
 from . import sync
@@ -8,7 +8,7 @@ class BaseClient:
         """
         raise NotImplementedError
 
-    def set(self, key: str, value):
+    def set(self, key: str, value, encoder=None):
         """Set the value of ``key``
 
         Args:
@@ -18,12 +18,17 @@ class BaseClient:
             value (``Any``):
                 The value to set for ``key``
 
+            encoder (``Callable``, *optional*):
+                The encoder class or instance used instead of the client ``default_encoder``, e.g. :class:`kvsqlite.NativeEncoder`
+                to store ``int``, ``float``, ``str`` and ``bytes`` values without serialization. Values are decoded with the same encoder
+                automatically. Only the built-in encoders, except :class:`kvsqlite.CompressedEncoder`, can be used. Defaults to ``None``
+
         Returns:
             :py:class:`bool`: ``True`` on success
         """
         raise NotImplementedError
 
-    def setex(self, key: str, ttl: int, value):
+    def setex(self, key: str, ttl: int, value, encoder=None):
         """Set the value of ``key`` with a timeout specified by ``ttl``
 
         Args:
@@ -36,6 +41,11 @@ class BaseClient:
             value (``Any``):
                 The value to set for ``key``
 
+            encoder (``Callable``, *optional*):
+                The encoder class or instance used instead of the client ``default_encoder``, e.g. :class:`kvsqlite.NativeEncoder`
+                to store ``int``, ``float``, ``str`` and ``bytes`` values without serialization. Values are decoded with the same encoder
+                automatically. Only the built-in encoders, except :class:`kvsqlite.CompressedEncoder`, can be used. Defaults to ``None``
+
         .. warning::
             Timeouted keys aren't deleted by default, you must call :func:`cleanex` from time to time
 
@@ -53,6 +63,193 @@ class BaseClient:
         """
         raise NotImplementedError
 
+    def mget(self, keys: list):
+        """Get the values of multiple ``keys`` in a single request
+
+        Args:
+            keys (``list``):
+                The keys to get
+
+        Returns:
+            :py:class:`list`: The values in the same order as ``keys``, ``None`` for missing keys
+        """
+        raise NotImplementedError
+
+    def mset(self, mapping: dict, encoder=None):
+        """Set multiple keys in a single request and transaction
+
+        Args:
+            mapping (``dict``):
+                A ``key`` to ``value`` mapping
+
+            encoder (``Callable``, *optional*):
+                The encoder class or instance used for all the values instead of the client ``default_encoder``, see :func:`set`. Defaults to ``None``
+
+        Returns:
+            :py:class:`bool`: ``True`` on success
+        """
+        raise NotImplementedError
+
+    def msetex(self, mapping: dict, ttl: int, encoder=None):
+        """Set multiple keys with a timeout specified by ``ttl`` in a single request and transaction
+
+        Args:
+            mapping (``dict``):
+                A ``key`` to ``value`` mapping
+
+            ttl (``int``):
+                The number of seconds for the keys timeout
+
+            encoder (``Callable``, *optional*):
+                The encoder class or instance used for all the values instead of the client ``default_encoder``, see :func:`set`. Defaults to ``None``
+
+        Returns:
+            :py:class:`bool`: ``True`` on success
+        """
+        raise NotImplementedError
+
+    def mdelete(self, keys: list):
+        """Delete multiple ``keys`` in a single request and transaction
+
+        Args:
+            keys (``list``):
+                The keys to delete
+
+        Returns:
+            :py:class:`int`: Number of deleted keys
+        """
+        raise NotImplementedError
+
+    def incr(self, key: str, by: int = 1):
+        """Atomically increment the number stored at ``key`` by ``by`` in a single statement.
+        Missing or expired keys are set to ``by``, the ``key`` timeout is kept otherwise
+
+        The number is stored natively (see :class:`kvsqlite.NativeEncoder`), numbers stored by another encoder
+        are converted on their first increment
+
+        Args:
+            key (``str``):
+                The key
+
+            by (``int``, *optional*):
+                The increment. Defaults to ``1``
+
+        Raises:
+            :py:class:`TypeError`: If the value of ``key`` is not a number
+
+        Returns:
+            :py:class:`int`: The value of ``key`` after the increment
+        """
+        raise NotImplementedError
+
+    def decr(self, key: str, by: int = 1):
+        """Atomically decrement the number stored at ``key`` by ``by``, see :func:`incr`
+
+        Args:
+            key (``str``):
+                The key
+
+            by (``int``, *optional*):
+                The decrement. Defaults to ``1``
+
+        Returns:
+            :py:class:`int`: The value of ``key`` after the decrement
+        """
+        raise NotImplementedError
+
+    def incrbyfloat(self, key: str, by: float = 1.0):
+        """Atomically increment the number stored at ``key`` by the float ``by``, see :func:`incr`
+
+        Args:
+            key (``str``):
+                The key
+
+            by (``float``, *optional*):
+                The increment. Defaults to ``1.0``
+
+        Returns:
+            :py:class:`float`: The value of ``key`` after the increment
+        """
+        raise NotImplementedError
+
+    def setnx(self, key: str, value, ttl: int = None, encoder=None):
+        """Set the value of ``key`` only if it doesn't exist (or is expired), in a single statement.
+        Useful for locks and idempotency keys
+
+        Args:
+            key (``str``):
+                The key
+
+            value (``Any``):
+                The value to set for ``key``
+
+            ttl (``int``, *optional*):
+                The number of seconds for ``key`` timeout. Defaults to ``None`` (no timeout)
+
+            encoder (``Callable``, *optional*):
+                The encoder class or instance used instead of the client ``default_encoder``, see :func:`set`. Defaults to ``None``
+
+        Returns:
+            :py:class:`bool`: ``True`` if ``key`` was set, ``False`` if it already exists
+        """
+        raise NotImplementedError
+
+    def getset(self, key: str, value, encoder=None):
+        """Atomically set the value of ``key`` and return its old value. The ``key`` timeout is removed
+
+        Args:
+            key (``str``):
+                The key
+
+            value (``Any``):
+                The value to set for ``key``
+
+            encoder (``Callable``, *optional*):
+                The encoder class or instance used instead of the client ``default_encoder``, see :func:`set`. Defaults to ``None``
+
+        Returns:
+            ``Any``: The old value of ``key``, ``None`` if it didn't exist
+        """
+        raise NotImplementedError
+
+    def getdel(self, key: str):
+        """Atomically delete ``key`` and return its value
+
+        Args:
+            key (``str``):
+                The key
+
+        Returns:
+            ``Any``: The value of ``key``, ``None`` if it didn't exist
+        """
+        raise NotImplementedError
+
+    def cas(self, key: str, expected, new, encoder=None):
+        """Set the value of ``key`` to ``new`` only if its current value is ``expected``, in a single statement.
+        The ``key`` timeout is kept
+
+        Args:
+            key (``str``):
+                The key
+
+            expected (``Any``):
+                The expected current value of ``key``
+
+            new (``Any``):
+                The value to set for ``key``
+
+            encoder (``Callable``, *optional*):
+                The encoder class or instance used for ``expected`` and ``new``, see :func:`set`. Defaults to ``None``
+
+        .. note::
+            Values are compared by their encoded form, so ``expected`` must be encoded with the encoder which stored
+            the current value. Equal values which encode differently (e.g. pickled dicts with a different keys order) don't match
+
+        Returns:
+            :py:class:`bool`: ``True`` if ``key`` was set, otherwise ``False``
+        """
+        raise NotImplementedError
+
     def commit(self):
         """Commit the current changes
 
@@ -62,7 +259,7 @@ class BaseClient:
         raise NotImplementedError
 
     def exists(self, key: str):
-        """Check if ``key`` already exists in database
+        """Check if ``key`` already exists in database and hasn't expired
 
         Args:
             key (``str``):
@@ -100,6 +297,62 @@ class BaseClient:
         """
         raise NotImplementedError
 
+    def pttl(self, key: str):
+        """Returns the remaining time to live of a ``key`` that has a timeout, in milliseconds
+
+        Args:
+            key (``str``):
+                The key
+
+        Returns:
+            :py:class:`int`: The remaining milliseconds, otherwise ``0``
+        """
+        raise NotImplementedError
+
+    def expire_at(self, key: str, timestamp: float):
+        """Set ``key`` to expire at ``timestamp``
+
+        Args:
+            key (``str``):
+                The key
+
+            timestamp (``int`` | ``float``):
+                The Unix timestamp, in seconds, when ``key`` expires
+
+        Returns:
+            :py:class:`bool`: ``True`` on success
+        """
+        raise NotImplementedError
+
+    def dump(self, key: str):
+        """Return the stored form of ``key``, to copy it with :func:`restore` without decoding it
+
+        Args:
+            key (``str``):
+                The key
+
+        Returns:
+            :py:class:`tuple`: The encoded value, its expire time in milliseconds since the epoch (or ``None``) and its type tag
+
+            :py:class:`None`: If ``key`` doesn't exist
+        """
+        raise NotImplementedError
+
+    def restore(self, key: str, dump: tuple):
+        """Set ``key`` to a value returned by :func:`dump`, with the same type tag and expire time
+
+        Args:
+            key (``str``):
+                The key
+
+            dump (``tuple``):
+                The :func:`dump` result
+
+        Returns:
+            :py:class:`bool`: ``True`` on success
+        """
+        raise NotImplementedError
+
     def rename(self, key: str, new_key: str):
         """Rename ``key`` with ``new_key``
 
@@ -131,6 +384,97 @@ class BaseClient:
         """
         raise NotImplementedError
 
+    def keys_prefix(self, prefix: str):
+        """Return the keys starting with ``prefix`` in key order. Unlike :func:`keys`, this uses the primary key index
+
+        Args:
+            prefix (``str``):
+                The keys prefix (case sensitive)
+
+        Returns:
+            :py:class:`list`: A list of :py:class:`str` keys
+        """
+        raise NotImplementedError
+
+    def keys_range(self, start: str = None, end: str = None):
+        """Return the keys where ``start <= key < end`` in key order
+
+        Args:
+            start (``str``, *optional*):
+                The inclusive lower bound. Defaults to ``None`` (no lower bound)
+
+            end (``str``, *optional*):
+                The exclusive upper bound. Defaults to ``None`` (no upper bound)
+
+        Returns:
+            :py:class:`list`: A list of :py:class:`str` keys
+        """
+        raise NotImplementedError
+
+    def keys_glob(self, pattern: str):
+        """Return the keys matching the SQLite GLOB ``pattern`` in key order.
+        The literal part of ``pattern`` before its first wildcard is served from the primary key index
+
+        Args:
+            pattern (``str``):
+                SQLite GLOB pattern (case sensitive), e.g. ``user:*:name``
+
+        Returns:
+            :py:class:`list`: A list of :py:class:`str` keys
+        """
+        raise NotImplementedError
+
+    def count(self, prefix: str = None):
+        """Count the keys starting with ``prefix`` without fetching them
+
+        Args:
+            prefix (``str``, *optional*):
+                The keys prefix. Defaults to ``None`` (all keys)
+
+        Returns:
+            :py:class:`int`: Number of keys
+        """
+        raise NotImplementedError
+
+    def scan(self, prefix: str = None, batch_size: int = 1000):
+        """Iterate over the keys in database in key order, fetching ``batch_size`` keys per request.
+        Memory usage stays constant regardless of the number of keys
+
+        Args:
+            prefix (``str``, *optional*):
+                Only iterate over keys starting with ``prefix``. Defaults to ``None`` (all keys)
+
+            batch_size (``int``, *optional*):
+                The number of keys fetched per request. Defaults to ``1000``
+
+        Yields:
+            :py:class:`str`: The keys
+        """
+        raise NotImplementedError
+
+    def iter_items(self, prefix: str = None, batch_size: int = 1000):
+        """Iterate over the keys and their values in database in key order, fetching ``batch_size`` items per request
+
+        Args:
+            prefix (``str``, *optional*):
+                Only iterate over keys starting with ``prefix``. Defaults to ``None`` (all keys)
+
+            batch_size (``int``, *optional*):
+                The number of items fetched per request. Defaults to ``1000``
+
+        Yields:
+            :py:class:`tuple`: ``(key, value)`` pairs
+        """
+        raise NotImplementedError
+
+    def flush_pending(self):
+        """Write the buffered writes of ``write_behind`` mode to the database now
+
+        Returns:
+            :py:class:`int`: Number of written keys
+        """
+        raise NotImplementedError
+
     def cleanex(self):
         """Removes all expired keys from database. This reduces disk usage
 
@@ -147,6 +491,65 @@ class BaseClient:
         """
         raise NotImplementedError
 
+    def stats(self):
+        """Return a snapshot of the requests metrics, when ``metrics`` is enabled
+
+        Each request type has its ``count``, ``errors`` and per phase latency histograms: ``queue`` (waiting for a worker),
+        ``lock`` (waiting for the writer lock), ``sql`` (executing statements), ``codec`` (encoding/decoding values) and ``total``.
+        Background work is reported as ``GROUP_COMMIT``, ``WRITE_BEHIND``, ``REAPER`` and ``LAZY_EXPIRY``.
+        Use :func:`kvsqlite.metrics.to_prometheus` to export it in the Prometheus text format
+
+        Returns:
+            :py:class:`dict`: The metrics snapshot
+
+            :py:class:`None`: If ``metrics`` is disabled
+        """
+        raise NotImplementedError
+
+    def add_hook(self, before=None, after=None):
+        """Register tracing hooks called around every request, e.g. to open and close tracing spans
+
+        ``before(request, key)`` is called before the request, ``after(request, key, context, duration, exception)``
+        after it, with ``context`` being the value returned by ``before``, ``duration`` in seconds and ``exception``
+        the raised exception or ``None``. Hooks run in the thread processing the request, their exceptions are logged and ignored
+
+        Args:
+            before (``Callable``, *optional*):
+                Called before each request. Defaults to ``None``.
+
+            after (``Callable``, *optional*):
+                Called after each request. Defaults to ``None``.
+        """
+        raise NotImplementedError
+
+    def remove_hook(self, before=None, after=None):
+        """Unregister hooks registered by :func:`add_hook` with the same ``before`` and ``after``"""
+        raise NotImplementedError
+
+    def cache_info(self):
+        """Return the read cache counters
+
+        Returns:
+            :py:class:`dict`:
+                Contains ``hits``, ``misses``, ``evictions``, ``entries``, ``bytes``, ``max_entries`` and ``max_bytes``
+
+            :py:class:`None`:
+                If the cache is disabled
+        """
+        raise NotImplementedError
+
+    def reaper_info(self):
+        """Return the background reaper counters
+
+        Returns:
+            :py:class:`dict`:
+                Contains ``runs``, ``deleted`` (total), ``last_deleted`` and ``last_duration`` (seconds) of the last run
+
+            :py:class:`None`:
+                If the reaper is disabled
+        """
+        raise NotImplementedError
+
     def close(self, optimize_database: bool = True):
         """Close database connection
 
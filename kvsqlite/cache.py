@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from threading import Lock
+
+MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe LRU cache of decoded values used by :class:`~kvsqlite.sqlite.Sqlite`
+
+    Args:
+        max_entries (``int``):
+            The maximum number of cached keys. ``0`` means no limit
+
+        max_bytes (``int``):
+            The maximum total size of the cached values, measured by their encoded size. ``0`` means no limit
+    """
+
+    def __init__(self, max_entries: int = 0, max_bytes: int = 0) -> None:
+        assert isinstance(max_entries, int), "max_entries must be int"
+        assert isinstance(max_bytes, int), "max_bytes must be int"
+        assert max_entries > 0 or max_bytes > 0, "max_entries or max_bytes is required"
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.__entries = OrderedDict()
+        self.__bytes = 0
+        self.__lock = Lock()
+
+        # Bumped on every invalidation, so a value read from the database
+        # before a concurrent write is never stored after that write
+        self.generation = 0
+
+    def get(self, key: str, now: float):
+        """Return the cached value of ``key`` or ``MISSING``"""
+
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+
+            value, expire_time, size = entry
+            if expire_time is not None and expire_time <= now:
+                del self.__entries[key]
+                self.__bytes -= size
+                self.misses += 1
+                return MISSING
+
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value, expire_time, size: int, generation: int):
+        with self.__lock:
+            if generation != self.generation:
+                return
+
+            if self.max_bytes and size > self.max_bytes:
+                return
+
+            old = self.__entries.pop(key, None)
+            if old is not None:
+                self.__bytes -= old[2]
+
+            self.__entries[key] = (value, expire_time, size)
+            self.__bytes += size
+
+            while (self.max_entries and len(self.__entries) > self.max_entries) or (
+                self.max_bytes and self.__bytes > self.max_bytes
+            ):
+                _, (_, _, evicted_size) = self.__entries.popitem(last=False)
+                self.__bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, *keys: str):
+        with self.__lock:
+            self.generation += 1
+            for key in keys:
+                entry = self.__entries.pop(key, None)
+                if entry is not None:
+                    self.__bytes -= entry[2]
+
+    def clear(self):
+        with self.__lock:
+            self.generation += 1
+            self.__entries.clear()
+            self.__bytes = 0
+
+    def info(self) -> dict:
+        with self.__lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self.__entries),
+                "bytes": self.__bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
@@ -1,9 +1,10 @@
 import asyncio
 import logging
 
-from typing import Any, List, Tuple, Union
-from .sqlite import Sqlite, REQUEST
-from .encoders import PickleEncoder
+from typing import Any, AsyncIterator, Callable, Dict, List, Tuple, Union
+from .sqlite import Sqlite, REQUEST, GROUP_COMMIT_REQUESTS, Typed, prefix_end
+from .engine import QueueEngine
+from .encoders import PickleEncoder, typed_encoder
 from .base import BaseClient
 
 logger = logging.getLogger(__name__)
@@ -20,6 +21,26 @@ class Client(BaseClient):
         default_encoder=PickleEncoder,
         workers: int = 2,
         loop: asyncio.AbstractEventLoop = None,
+        group_commit: bool = False,
+        group_commit_delay: float = 0.002,
+        group_commit_size: int = 256,
+        read_pool: bool = True,
+        cache_size: int = 0,
+        cache_bytes: int = 0,
+        reaper_interval: float = None,
+        reaper_chunk: int = 1000,
+        encode_processes: int = 0,
+        encode_threshold: int = 1048576,
+        queue_engine: bool = False,
+        write_behind: bool = False,
+        write_behind_delay: float = 0.1,
+        write_behind_size: int = 1000,
+        pragmas: Union[str, Dict[str, Union[int, str]]] = None,
+        metrics: bool = False,
+        slow_threshold: float = None,
+        redact_keys: bool = False,
+        trace: bool = False,
+        lazy_expiry: bool = False,
     ):
         """Kvsqlite asynchronous client
 
@@ -40,37 +61,167 @@ class Client(BaseClient):
                 See https://www.sqlite.org/pragma.html#pragma_synchronous. Defaults to ``NORMAL``.
 
             default_encoder (``Callable``, *optional*):
-                The encoder class which deal with the data sent/received by sqlite3. Defaults to :class:`kvsqlite.PickleEncoder`.
+                The encoder class (or instance, e.g. a configured :class:`kvsqlite.CompressedEncoder`) which deal with the data sent/received by sqlite3. Defaults to :class:`kvsqlite.PickleEncoder`.
 
             workers (``int``, *optional*):
                 The number of workers which process sqlite queries. Defaults to ``2``.
 
             loop (:py:class:`~asyncio.AbstractEventLoop`, *optional*):
                 Event loop. Defaults to ``None``.
+
+            group_commit (``bool``, *optional*):
+                Whether to wrap concurrent ``set``, ``setex`` and ``delete`` calls into one shared transaction
+                when ``autocommit`` is enabled. Each call returns only after the shared transaction is committed. Defaults to ``False``.
+
+            group_commit_delay (``float``, *optional*):
+                The maximum number of seconds to wait for more writes before committing a group. Defaults to ``0.002``.
+
+            group_commit_size (``int``, *optional*):
+                The maximum number of writes committed in one group. Defaults to ``256``.
+
+            read_pool (``bool``, *optional*):
+                Whether each worker uses its own read-only connection so reads run in parallel.
+                Only applies to file databases in ``WAL`` mode with ``autocommit`` enabled. Defaults to ``True``.
+
+            cache_size (``int``, *optional*):
+                The maximum number of decoded values kept in an in-memory LRU cache in front of ``get``. Defaults to ``0`` (disabled).
+
+            cache_bytes (``int``, *optional*):
+                The maximum total encoded size in bytes of the cached values. Defaults to ``0`` (disabled).
+
+            reaper_interval (``float``, *optional*):
+                The number of seconds between background runs deleting expired keys, requires ``autocommit``.
+                Defaults to ``None`` (disabled).
+
+            reaper_chunk (``int``, *optional*):
+                The maximum number of expired keys deleted per transaction by the background reaper. Defaults to ``1000``.
+
+            encode_processes (``int``, *optional*):
+                The number of processes used to encode values larger than ``encode_threshold``, the encoder must be picklable.
+                Useful with CPU heavy encoders. Defaults to ``0`` (values are encoded by the workers).
+
+            encode_threshold (``int``, *optional*):
+                The approximate value size in bytes from which values are encoded in ``encode_processes``. Defaults to ``1048576`` (1 MiB).
+
+            queue_engine (``bool``, *optional*):
+                Whether requests are queued to one dedicated thread which processes them in batches and resolves
+                each batch with a single event loop wakeup, instead of going through ``workers``.
+                Reduces the event loop overhead of many concurrent requests (e.g. ``asyncio.gather``). Defaults to ``False``.
+
+            write_behind (``bool``, *optional*):
+                Whether ``set``, ``setex`` and ``delete`` only update an in-memory buffer and return right away, while a background thread
+                writes the latest value of each buffered key to the database every ``write_behind_delay`` seconds. Buffered values are readable by ``get``,
+                other requests write the buffer first. Writes of the last ``write_behind_delay`` seconds are lost on crash,
+                ``delete`` always returns ``True``. Defaults to ``False``.
+
+            write_behind_delay (``float``, *optional*):
+                The maximum number of seconds writes stay in the write-behind buffer. Defaults to ``0.1``.
+
+            write_behind_size (``int``, *optional*):
+                The number of buffered keys which triggers a write before ``write_behind_delay``. Defaults to ``1000``.
+
+            pragmas (``str`` | ``dict``, *optional*):
+                Connection tuning applied to every connection: a preset name (``read-heavy``, ``bulk-load`` or ``multi-process``)
+                or a mapping of ``cache_size``, ``mmap_size``, ``temp_store``, ``page_size``, ``wal_autocheckpoint`` and ``busy_timeout``
+                to their values, see https://www.sqlite.org/pragma.html and :data:`kvsqlite.pragmas.PRESETS`.
+                Changing ``page_size`` of an existing database rewrites it with ``VACUUM``. Defaults to ``None``.
+
+            metrics (``bool``, *optional*):
+                Whether to record counts, errors and latency histograms of each request type, split into queue, lock, sql and codec phases.
+                See :func:`stats`. Defaults to ``False``.
+
+            slow_threshold (``float``, *optional*):
+                Log a warning with the request type, key, duration and writer lock wait of requests taking at least this many seconds.
+                Defaults to ``None`` (disabled).
+
+            redact_keys (``bool``, *optional*):
+                Whether to hide keys and bound values from the slow request log. Defaults to ``False``.
+
+            trace (``bool``, *optional*):
+                Whether to log every executed statement at ``DEBUG`` level, slow requests are then logged with their statements
+                and query plans. Defaults to ``False``.
+
+            lazy_expiry (``bool``, *optional*):
+                Whether ``get`` and ``exists`` calls finding an expired key queue it for deletion, expired keys are then deleted
+                in batches by a background thread, requires ``autocommit``. Defaults to ``False``.
+
+        .. warning::
+            Cached values are shared between ``get`` calls, mutating a returned object changes the cached value too.
+            The cache is only invalidated by this client, so don't enable it when other processes write to the same database
         """
         assert isinstance(database, str), "database must be str"
         assert isinstance(table_name, str), "table_name must be str"
         assert isinstance(autocommit, bool), "autocommit must be bool"
         assert isinstance(journal_mode, str), "journal_mode must be str"
         assert isinstance(synchronous, str), "synchronous must be str"
-        assert callable(default_encoder), "default_encoder must be callable"
         assert isinstance(workers, int), "workers must be int"
         assert workers > 0, "workers must be greater than 0"
-
-        assert hasattr(
-            default_encoder, "encode"
-        ), "{} must have an 'encode' function".format(default_encoder.__name__)
-        assert hasattr(
-            default_encoder, "decode"
-        ), "{} must have an 'decode' function".format(default_encoder.__name__)
+        assert isinstance(group_commit, bool), "group_commit must be bool"
+        assert group_commit_delay >= 0, "group_commit_delay must be positive"
+        assert group_commit_size > 0, "group_commit_size must be greater than 0"
+        assert isinstance(read_pool, bool), "read_pool must be bool"
+        assert isinstance(cache_size, int), "cache_size must be int"
+        assert isinstance(cache_bytes, int), "cache_bytes must be int"
+        assert (
+            reaper_interval is None or reaper_interval > 0
+        ), "reaper_interval must be greater than 0"
+        assert isinstance(reaper_chunk, int), "reaper_chunk must be int"
+        assert reaper_chunk > 0, "reaper_chunk must be greater than 0"
+        assert isinstance(encode_processes, int), "encode_processes must be int"
+        assert isinstance(encode_threshold, int), "encode_threshold must be int"
+        assert isinstance(queue_engine, bool), "queue_engine must be bool"
+        assert isinstance(write_behind, bool), "write_behind must be bool"
+        assert write_behind_delay > 0, "write_behind_delay must be greater than 0"
+        assert write_behind_size > 0, "write_behind_size must be greater than 0"
+        assert pragmas is None or isinstance(
+            pragmas, (str, dict)
+        ), "pragmas must be str or dict"
+        assert isinstance(metrics, bool), "metrics must be bool"
+        assert slow_threshold is None or isinstance(
+            slow_threshold, (int, float)
+        ), "slow_threshold must be int or float"
+        assert isinstance(redact_keys, bool), "redact_keys must be bool"
+        assert isinstance(trace, bool), "trace must be bool"
+        assert isinstance(lazy_expiry, bool), "lazy_expiry must be bool"
+
+        encoder = (
+            default_encoder() if isinstance(default_encoder, type) else default_encoder
+        )
+        encoder_name = type(encoder).__name__
+        assert hasattr(encoder, "encode"), "{} must have an 'encode' function".format(
+            encoder_name
+        )
+        assert hasattr(encoder, "decode"), "{} must have an 'decode' function".format(
+            encoder_name
+        )
 
         self.database = database
         self.table_name = table_name
         self.autocommit = autocommit
         self.journal_mode = journal_mode
         self.synchronous = synchronous
-        self.__encoder = default_encoder()
+        self.__encoder = encoder
         self.workers = workers
+        self.group_commit = group_commit
+        self.group_commit_delay = group_commit_delay
+        self.group_commit_size = group_commit_size
+        self.read_pool = read_pool
+        self.cache_size = cache_size
+        self.cache_bytes = cache_bytes
+        self.reaper_interval = reaper_interval
+        self.reaper_chunk = reaper_chunk
+        self.encode_processes = encode_processes
+        self.encode_threshold = encode_threshold
+        self.queue_engine = queue_engine
+        self.write_behind = write_behind
+        self.write_behind_delay = write_behind_delay
+        self.write_behind_size = write_behind_size
+        self.pragmas = pragmas
+        self.metrics = metrics
+        self.slow_threshold = slow_threshold
+        self.redact_keys = redact_keys
+        self.trace = trace
+        self.lazy_expiry = lazy_expiry
         self.loop = (
             loop
             if isinstance(loop, asyncio.AbstractEventLoop)
@@ -85,9 +236,30 @@ class Client(BaseClient):
             self.synchronous,
             self.__encoder,
             self.workers,
+            self.group_commit,
+            self.group_commit_delay,
+            self.group_commit_size,
+            self.read_pool,
+            self.cache_size,
+            self.cache_bytes,
+            self.reaper_interval,
+            self.reaper_chunk,
+            self.encode_processes,
+            self.encode_threshold,
+            self.write_behind,
+            self.write_behind_delay,
+            self.write_behind_size,
+            self.pragmas,
+            self.metrics,
+            self.slow_threshold,
+            self.redact_keys,
+            self.trace,
+            self.lazy_expiry,
         )
 
-        logger.debug("Using {} as encoder".format(default_encoder.__name__))
+        self.__engine = QueueEngine(self.__sqlite, self.loop) if queue_engine else None
+
+        logger.debug("Using {} as encoder".format(encoder_name))
 
     async def __aenter__(self):
         return self
@@ -103,16 +275,22 @@ class Client(BaseClient):
 
         return await self.__invoke(request=REQUEST.GET, key=key)
 
-    async def set(self, key: str, value) -> bool:
+    async def set(self, key: str, value, encoder=None) -> bool:
         assert isinstance(key, str), "key must be str"
 
+        if encoder is not None:
+            value = Typed(value, typed_encoder(encoder))
+
         future = self.__invoke(request=REQUEST.SET, key=key, value=value)
         return await future
 
-    async def setex(self, key: str, ttl: int, value) -> bool:
+    async def setex(self, key: str, ttl: int, value, encoder=None) -> bool:
         assert isinstance(key, str), "key must be str"
         assert ttl >= 1, "ttl must be greater than 1"
 
+        if encoder is not None:
+            value = Typed(value, typed_encoder(encoder))
+
         future = self.__invoke(request=REQUEST.SETEX, key=key, value=[value, ttl])
         return await future
 
@@ -122,6 +300,99 @@ class Client(BaseClient):
         future = self.__invoke(request=REQUEST.DELETE, key=key)
         return await future
 
+    async def mget(self, keys: List[str]) -> List[Any]:
+        assert isinstance(keys, (list, tuple)), "keys must be list"
+        assert all(isinstance(key, str) for key in keys), "keys must be list of str"
+
+        future = self.__invoke(request=REQUEST.MGET, key=list(keys))
+        return await future
+
+    async def mset(self, mapping: Dict[str, Any], encoder=None) -> bool:
+        assert isinstance(mapping, dict), "mapping must be dict"
+        assert all(isinstance(key, str) for key in mapping), "keys must be str"
+
+        if encoder is not None:
+            encoder = typed_encoder(encoder)
+            mapping = {key: Typed(value, encoder) for key, value in mapping.items()}
+
+        future = self.__invoke(request=REQUEST.MSET, value=mapping)
+        return await future
+
+    async def msetex(self, mapping: Dict[str, Any], ttl: int, encoder=None) -> bool:
+        assert isinstance(mapping, dict), "mapping must be dict"
+        assert all(isinstance(key, str) for key in mapping), "keys must be str"
+        assert ttl >= 1, "ttl must be greater than 1"
+
+        if encoder is not None:
+            encoder = typed_encoder(encoder)
+            mapping = {key: Typed(value, encoder) for key, value in mapping.items()}
+
+        future = self.__invoke(request=REQUEST.MSETEX, value=[mapping, ttl])
+        return await future
+
+    async def mdelete(self, keys: List[str]) -> int:
+        assert isinstance(keys, (list, tuple)), "keys must be list"
+        assert all(isinstance(key, str) for key in keys), "keys must be list of str"
+
+        future = self.__invoke(request=REQUEST.MDELETE, key=list(keys))
+        return await future
+
+    async def incr(self, key: str, by: int = 1) -> int:
+        assert isinstance(key, str), "key must be str"
+        assert isinstance(by, int), "by must be int"
+
+        future = self.__invoke(request=REQUEST.INCR, key=key, value=by)
+        return await future
+
+    async def decr(self, key: str, by: int = 1) -> int:
+        assert isinstance(key, str), "key must be str"
+        assert isinstance(by, int), "by must be int"
+
+        future = self.__invoke(request=REQUEST.INCR, key=key, value=-by)
+        return await future
+
+    async def incrbyfloat(self, key: str, by: float = 1.0) -> float:
+        assert isinstance(key, str), "key must be str"
+        assert isinstance(by, (int, float)), "by must be float"
+
+        future = self.__invoke(request=REQUEST.INCR, key=key, value=float(by))
+        return await future
+
+    async def setnx(self, key: str, value, ttl: int = None, encoder=None) -> bool:
+        assert isinstance(key, str), "key must be str"
+        assert ttl is None or ttl >= 1, "ttl must be greater than 1"
+
+        if encoder is not None:
+            value = Typed(value, typed_encoder(encoder))
+
+        future = self.__invoke(request=REQUEST.SETNX, key=key, value=[value, ttl])
+        return await future
+
+    async def getset(self, key: str, value, encoder=None) -> Any:
+        assert isinstance(key, str), "key must be str"
+
+        if encoder is not None:
+            value = Typed(value, typed_encoder(encoder))
+
+        future = self.__invoke(request=REQUEST.GETSET, key=key, value=value)
+        return await future
+
+    async def getdel(self, key: str) -> Any:
+        assert isinstance(key, str), "key must be str"
+
+        future = self.__invoke(request=REQUEST.GETDEL, key=key)
+        return await future
+
+    async def cas(self, key: str, expected, new, encoder=None) -> bool:
+        assert isinstance(key, str), "key must be str"
+
+        if encoder is not None:
+            encoder = typed_encoder(encoder)
+            expected, new = Typed(expected, encoder), Typed(new, encoder)
+
+        future = self.__invoke(request=REQUEST.CAS, key=key, value=[expected, new])
+        return await future
+
     async def commit(self) -> bool:
         future = self.__invoke(request=REQUEST.COMMIT)
         return await future
@@ -145,6 +416,36 @@ class Client(BaseClient):
         future = self.__invoke(request=REQUEST.EXPIRE, key=key, value=ttl)
         return await future
 
+    async def pttl(self, key: str) -> int:
+        assert isinstance(key, str), "key must be str"
+
+        future = self.__invoke(request=REQUEST.PTTL, key=key)
+        return await future
+
+    async def expire_at(self, key: str, timestamp: Union[int, float]) -> bool:
+        assert isinstance(key, str), "key must be str"
+        assert isinstance(timestamp, (int, float)), "timestamp must be int or float"
+
+        future = self.__invoke(
+            request=REQUEST.EXPIRE_AT, key=key, value=int(timestamp * 1000)
+        )
+        return await future
+
+    async def dump(self, key: str) -> Union[Tuple[Any, int, int], None]:
+        assert isinstance(key, str), "key must be str"
+
+        future = self.__invoke(request=REQUEST.DUMP, key=key)
+        return await future
+
+    async def restore(self, key: str, dump: Tuple[Any, int, int]) -> bool:
+        assert isinstance(key, str), "key must be str"
+        assert (
+            isinstance(dump, tuple) and len(dump) == 3
+        ), "dump must be a dump() result"
+
+        future = self.__invoke(request=REQUEST.RESTORE, key=key, value=dump)
+        return await future
+
     async def rename(self, key: str, new_key: str) -> bool:
         assert isinstance(key, str), "key must be str"
         assert isinstance(new_key, str), "new_key must be str"
@@ -158,6 +459,75 @@ class Client(BaseClient):
         future = self.__invoke(request=REQUEST.KEYS, value=like)
         return await future
 
+    async def keys_prefix(self, prefix: str) -> List[str]:
+        assert isinstance(prefix, str), "prefix must be str"
+
+        future = self.__invoke(
+            request=REQUEST.KEYS_RANGE, value=[prefix, prefix_end(prefix)]
+        )
+        return await future
+
+    async def keys_range(self, start: str = None, end: str = None) -> List[str]:
+        assert start is None or isinstance(start, str), "start must be str"
+        assert end is None or isinstance(end, str), "end must be str"
+
+        future = self.__invoke(request=REQUEST.KEYS_RANGE, value=[start, end])
+        return await future
+
+    async def keys_glob(self, pattern: str) -> List[str]:
+        assert isinstance(pattern, str), "pattern must be str"
+
+        future = self.__invoke(request=REQUEST.KEYS_GLOB, value=pattern)
+        return await future
+
+    async def count(self, prefix: str = None) -> int:
+        assert prefix is None or isinstance(prefix, str), "prefix must be str"
+
+        future = self.__invoke(request=REQUEST.COUNT, value=prefix)
+        return await future
+
+    async def scan(
+        self, prefix: str = None, batch_size: int = 1000
+    ) -> AsyncIterator[str]:
+        assert prefix is None or isinstance(prefix, str), "prefix must be str"
+        assert isinstance(batch_size, int), "batch_size must be int"
+        assert batch_size > 0, "batch_size must be greater than 0"
+
+        after = None
+        while True:
+            keys = await self.__invoke(
+                request=REQUEST.SCAN, value=[prefix, after, batch_size, False]
+            )
+            for key in keys:
+                yield key
+
+            if len(keys) < batch_size:
+                return
+            after = keys[-1]
+
+    async def iter_items(
+        self, prefix: str = None, batch_size: int = 1000
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        assert prefix is None or isinstance(prefix, str), "prefix must be str"
+        assert isinstance(batch_size, int), "batch_size must be int"
+        assert batch_size > 0, "batch_size must be greater than 0"
+
+        after = None
+        while True:
+            items = await self.__invoke(
+                request=REQUEST.SCAN, value=[prefix, after, batch_size, True]
+            )
+            for item in items:
+                yield item
+
+            if len(items) < batch_size:
+                return
+            after = items[-1][0]
+
+    async def flush_pending(self) -> int:
+        future = self.__invoke(request=REQUEST.FLUSH_PENDING)
+        return await future
+
     async def cleanex(self) -> int:
         future = self.__invoke(request=REQUEST.CLEAN_EX)
         return await future
@@ -166,6 +536,21 @@ class Client(BaseClient):
         future = self.__invoke(request=REQUEST.FLUSH_DB)
         return await future
 
+    def stats(self) -> Union[Dict[str, Any], None]:
+        return self.__sqlite.stats()
+
+    def add_hook(self, before: Callable = None, after: Callable = None) -> None:
+        self.__sqlite.add_hook(before, after)
+
+    def remove_hook(self, before: Callable = None, after: Callable = None) -> None:
+        self.__sqlite.remove_hook(before, after)
+
+    def cache_info(self) -> Union[Dict[str, int], None]:
+        return self.__sqlite.cache_info()
+
+    def reaper_info(self) -> Union[Dict[str, Union[int, float]], None]:
+        return self.__sqlite.reaper_info()
+
     async def close(self, optimize_database: bool = True) -> bool:
         assert isinstance(optimize_database, bool), "optimize_database must be bool"
 
@@ -175,5 +560,12 @@ class Client(BaseClient):
     def __invoke(self, request, key=None, value=None):
         assert self.__sqlite.is_running, "Database is closed"
 
+        if self.__engine is not None and not (
+            self.__sqlite.group_commit and request in GROUP_COMMIT_REQUESTS
+        ):
+            # Group-commit writes still wait for their shared transaction in
+            # the committer thread
+            return self.__engine.request(request, key, value)
+
         future = self.__sqlite.request(request, key, value)
         return asyncio.wrap_future(future, loop=self.loop)
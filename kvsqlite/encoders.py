@@ -1,30 +1,266 @@
+import json
+import lzma
+import zlib
+
 from pickle import dumps, loads, HIGHEST_PROTOCOL
-from sqlite3 import Binary
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+NATIVE_TYPES = (int, float, str, bytes, bytearray, memoryview)
+
+
+class NativeEncoder:
+    """Encoder which stores :py:class:`int`, :py:class:`float`, :py:class:`str` and :py:class:`bytes` values
+    as SQLite ``INTEGER``, ``REAL``, ``TEXT`` and ``BLOB`` without any serialization"""
+
+    type_tag = 1
+
+    def __init__(self) -> None:
+        pass
+
+    def encode(self, obj):
+        # bool is a subclass of int, but would be returned as int
+        assert type(obj) in NATIVE_TYPES, "{} can't be stored natively".format(
+            type(obj).__name__
+        )
+        return obj
+
+    def decode(self, obj):
+        return obj
 
 
 class PickleEncoder:
     """Encoder which uses pickle to serialize/deserialize the object"""
 
+    type_tag = 2
+
     def __init__(self) -> None:
         pass
 
     def encode(self, obj):
-        return Binary(dumps(obj, protocol=HIGHEST_PROTOCOL))
+        # sqlite3 stores bytes as BLOB, no need to wrap them with sqlite3.Binary
+        return dumps(obj, protocol=HIGHEST_PROTOCOL)
 
     def decode(self, obj):
-        return loads(bytes(obj))
+        # loads accepts any bytes-like object, so the blob isn't copied
+        return loads(obj)
 
 
 class StringEncoder:
     """This encoder can be used instead of :class:`PickleEncoder`. This encoder accpets :py:class:`str` only"""
 
+    type_tag = 3
+
     def __init__(self) -> None:
         pass
 
     def encode(self, text):
         assert isinstance(text, str), "text is not str"
-        return Binary(text.encode("utf-8"))
+        return text.encode("utf-8")
 
     def decode(self, text):
-        assert isinstance(text, str), "text is not str"
-        return text
+        if isinstance(text, str):
+            return text
+        return str(text, "utf-8")
+
+
+class BytesEncoder:
+    """Encoder which stores :py:class:`bytes`, :py:class:`bytearray` and :py:class:`memoryview` values as is,
+    without any serialization. Values are returned as :py:class:`bytes`"""
+
+    type_tag = 4
+
+    def __init__(self) -> None:
+        pass
+
+    def encode(self, data):
+        assert isinstance(
+            data, (bytes, bytearray, memoryview)
+        ), "data is not bytes-like object"
+        return data
+
+    def decode(self, data):
+        if isinstance(data, bytes):
+            return data
+        return bytes(data)
+
+
+class JSONEncoder:
+    """Encoder which uses json to serialize/deserialize the object. Unlike :class:`PickleEncoder`,
+    stored values can be read by other languages, but only JSON types are supported"""
+
+    type_tag = 5
+
+    def __init__(self) -> None:
+        pass
+
+    def encode(self, obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode(
+            "utf-8"
+        )
+
+    def decode(self, obj):
+        if isinstance(obj, memoryview):
+            obj = bytes(obj)
+        return json.loads(obj)
+
+
+class CompressedEncoder:
+    """Encoder which compresses the payloads of another encoder
+
+    Each payload is prefixed with a one-byte header telling how it was stored, payloads
+    written without this encoder (e.g. by :class:`PickleEncoder`, which always start with ``0x80``) are decoded as is.
+
+    Args:
+        encoder (``Callable``, *optional*):
+            The encoder class or instance which serialize the values. Defaults to :class:`PickleEncoder`
+
+        codec (``str``, *optional*):
+            ``zlib``, ``lzma`` or ``zstd`` (requires `zstandard <https://pypi.org/project/zstandard/>`_). Defaults to ``zlib``
+
+        level (``int``, *optional*):
+            Compression level. Defaults to ``None`` (codec default)
+
+        threshold (``int``, *optional*):
+            Payloads smaller than ``threshold`` bytes are stored uncompressed. Defaults to ``512``
+
+        dictionary (``bytes``, *optional*):
+            A shared dictionary of data common to the values (or a trained ``zstd`` dictionary) which improves
+            the compression of small payloads. Values must be decoded with the same dictionary. Not supported by ``lzma``. Defaults to ``None``
+    """
+
+    RAW = 0x00
+    ZLIB = 0x01
+    LZMA = 0x02
+    ZSTD = 0x03
+    ZLIB_DICTIONARY = 0x04
+    ZSTD_DICTIONARY = 0x05
+
+    def __init__(
+        self,
+        encoder=PickleEncoder,
+        codec: str = "zlib",
+        level: int = None,
+        threshold: int = 512,
+        dictionary: bytes = None,
+    ) -> None:
+        assert codec in ("zlib", "lzma", "zstd"), "codec must be zlib, lzma or zstd"
+        assert codec != "zstd" or zstandard is not None, "zstd requires zstandard"
+        assert (
+            dictionary is None or codec != "lzma"
+        ), "lzma doesn't support dictionaries"
+        assert isinstance(threshold, int), "threshold must be int"
+
+        self.encoder = encoder() if isinstance(encoder, type) else encoder
+        self.codec = codec
+        self.level = level
+        self.threshold = threshold
+        self.dictionary = dictionary
+
+        self.__zstd_dictionary = (
+            zstandard.ZstdCompressionDict(dictionary)
+            if zstandard is not None and dictionary is not None
+            else None
+        )
+
+        if codec == "zlib":
+            self.tag = self.ZLIB if dictionary is None else self.ZLIB_DICTIONARY
+        elif codec == "lzma":
+            self.tag = self.LZMA
+        else:
+            self.tag = self.ZSTD if dictionary is None else self.ZSTD_DICTIONARY
+
+    def encode(self, obj):
+        payload = bytes(self.encoder.encode(obj))
+
+        if len(payload) >= self.threshold:
+            compressed = self.__compress(payload)
+            if len(compressed) < len(payload):
+                return bytes((self.tag,)) + compressed
+
+        return bytes((self.RAW,)) + payload
+
+    def decode(self, obj):
+        data = memoryview(obj)
+        tag = data[0]
+
+        if tag == self.RAW:
+            payload = data[1:]
+        elif tag == self.ZLIB:
+            payload = zlib.decompress(data[1:])
+        elif tag == self.ZLIB_DICTIONARY:
+            assert self.dictionary is not None, "a dictionary is required"
+            decompressor = zlib.decompressobj(zdict=self.dictionary)
+            payload = decompressor.decompress(data[1:]) + decompressor.flush()
+        elif tag == self.LZMA:
+            payload = lzma.decompress(data[1:])
+        elif tag in (self.ZSTD, self.ZSTD_DICTIONARY):
+            assert zstandard is not None, "zstd requires zstandard"
+            decompressor = zstandard.ZstdDecompressor(
+                dict_data=(
+                    self.__zstd_dictionary if tag == self.ZSTD_DICTIONARY else None
+                )
+            )
+            payload = decompressor.decompress(data[1:])
+        else:
+            # Stored before compression was enabled
+            payload = data
+
+        return self.encoder.decode(payload)
+
+    def __compress(self, payload: bytes) -> bytes:
+        if self.codec == "zlib":
+            level = -1 if self.level is None else self.level
+            if self.dictionary is None:
+                return zlib.compress(payload, level)
+
+            compressor = zlib.compressobj(level, zdict=self.dictionary)
+            return compressor.compress(payload) + compressor.flush()
+        elif self.codec == "lzma":
+            return lzma.compress(payload, preset=self.level)
+        else:
+            # ZstdCompressor instances can't be shared between threads
+            return zstandard.ZstdCompressor(
+                level=3 if self.level is None else self.level,
+                dict_data=self.__zstd_dictionary,
+            ).compress(payload)
+
+
+# Encoders which values are decoded from the type tag stored next to them, so
+# values written with a per-call encoder are read back with the same encoder
+DECODERS = {
+    encoder.type_tag: encoder()
+    for encoder in (
+        NativeEncoder,
+        PickleEncoder,
+        StringEncoder,
+        BytesEncoder,
+        JSONEncoder,
+    )
+}
+
+
+def type_tag(encoder):
+    """Return the type tag of ``encoder`` values, or ``None`` if only ``encoder`` itself can decode them"""
+
+    tag = getattr(encoder, "type_tag", None)
+    if tag is not None and type(DECODERS.get(tag)) is type(encoder):
+        return tag
+
+    return None
+
+
+def typed_encoder(encoder):
+    """Return the instance of the per-call ``encoder`` class or instance"""
+
+    encoder = encoder() if isinstance(encoder, type) else encoder
+    assert (
+        type_tag(encoder) is not None
+    ), "{} has no type tag, it can only be used as default_encoder".format(
+        type(encoder).__name__
+    )
+
+    return encoder
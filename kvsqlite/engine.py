@@ -0,0 +1,98 @@
+import asyncio
+import logging
+
+from collections import deque
+from threading import Event, Thread
+from .sqlite import Sqlite, REQUEST
+
+logger = logging.getLogger(__name__)
+
+# The maximum number of requests processed before their futures are resolved,
+# so callers of a long burst don't wait for the whole queue
+BATCH_SIZE = 1024
+
+
+class QueueEngine:
+    """Process the requests of an asyncio client in one dedicated thread
+
+    Requests are queued from the event loop and processed in batches, the futures of each batch
+    are resolved with a single ``call_soon_threadsafe`` instead of one per request.
+    """
+
+    def __init__(self, sqlite: Sqlite, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+        self.is_running = True
+
+        self.__sqlite = sqlite
+        # deque appends and pops are thread-safe, the event is only set when
+        # the thread may be waiting
+        self.__queue = deque()
+        self.__wakeup = Event()
+        self.__thread = Thread(
+            target=self.__run, name="kvsqlite-queue-engine", daemon=True
+        )
+        self.__thread.start()
+
+    def request(self, request, key: str = None, value=None) -> asyncio.Future:
+        if not self.is_running:
+            raise RuntimeError("Database is closed")
+
+        future = self.loop.create_future()
+        self.__queue.append((future, request, key, value))
+        if not self.__wakeup.is_set():
+            self.__wakeup.set()
+
+        return future
+
+    def __run(self):
+        queue = self.__queue
+        while True:
+            if not queue:
+                # Cleared before checking the queue again, so a request queued
+                # in between sets the event and isn't missed
+                self.__wakeup.clear()
+                if not queue:
+                    self.__wakeup.wait()
+                    continue
+
+            batch = []
+            while queue and len(batch) < BATCH_SIZE:
+                future, request, key, value = queue.popleft()
+                try:
+                    result = self.__sqlite.procces_request(request, key, value)
+                    batch.append((future, result, None))
+                except Exception as e:
+                    batch.append((future, None, e))
+
+                if request == REQUEST.CLOSE and not self.__sqlite.is_running:
+                    self.is_running = False
+                    break
+
+            self.__resolve_threadsafe(self.__resolve, batch)
+
+            if not self.is_running:
+                # Requests queued before is_running was seen by the event loop
+                # are failed from the loop, where requests are queued
+                self.__resolve_threadsafe(self.__fail_pending)
+                return
+
+    def __resolve_threadsafe(self, callback, *args):
+        try:
+            self.loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            logger.exception("Event loop is closed, can't resolve requests")
+
+    def __resolve(self, batch: list):
+        for future, result, exception in batch:
+            if future.cancelled():
+                continue
+            elif exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+
+    def __fail_pending(self):
+        while self.__queue:
+            future = self.__queue.popleft()[0]
+            if not future.cancelled():
+                future.set_exception(RuntimeError("Database is closed"))
@@ -0,0 +1,232 @@
+import sqlite3
+
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+from typing import Dict
+
+# Histogram buckets upper bounds in seconds
+BUCKETS = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# queue: waiting for a worker, lock: waiting for the writer lock, sql: executing
+# statements, codec: encoding and decoding values, total: processing the request
+PHASES = ("queue", "lock", "sql", "codec", "total")
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Return the upper bound of the bucket containing the ``q`` quantile"""
+
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+
+        return self.max
+
+    def snapshot(self) -> dict:
+        buckets = {}
+        cumulative = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        buckets[float("inf")] = self.count
+
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+class Metrics:
+    """Counters and latency histograms per request type and phase"""
+
+    def __init__(self) -> None:
+        self.__lock = Lock()
+        self.__requests = {}
+        self.queued = 0
+
+    def __request(self, request: str) -> dict:
+        stats = self.__requests.get(request)
+        if stats is None:
+            stats = self.__requests[request] = {
+                "count": 0,
+                "errors": 0,
+                "phases": {phase: Histogram() for phase in PHASES},
+            }
+        return stats
+
+    def observe(self, request: str, phase: str, seconds: float):
+        with self.__lock:
+            self.__request(request)["phases"][phase].observe(seconds)
+
+    def finish(self, request: str, seconds: float, error: bool):
+        with self.__lock:
+            stats = self.__request(request)
+            stats["count"] += 1
+            if error:
+                stats["errors"] += 1
+            stats["phases"]["total"].observe(seconds)
+
+    def enqueue(self):
+        with self.__lock:
+            self.queued += 1
+
+    def dequeue(self, request: str, seconds: float):
+        with self.__lock:
+            self.queued -= 1
+            self.__request(request)["phases"]["queue"].observe(seconds)
+
+    def snapshot(self) -> dict:
+        with self.__lock:
+            return {
+                "queued": self.queued,
+                "requests": {
+                    request: {
+                        "count": stats["count"],
+                        "errors": stats["errors"],
+                        "phases": {
+                            phase: histogram.snapshot()
+                            for phase, histogram in stats["phases"].items()
+                            if histogram.count
+                        },
+                    }
+                    for request, stats in self.__requests.items()
+                },
+            }
+
+
+class TimedLock:
+    """Lock wrapper which reports the time spent waiting for ``lock``"""
+
+    __slots__ = ("lock", "observe")
+
+    def __init__(self, lock, observe) -> None:
+        self.lock = lock
+        self.observe = observe
+
+    def __enter__(self):
+        start = perf_counter()
+        self.lock.acquire()
+        self.observe("lock", perf_counter() - start)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.lock.release()
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection which reports the time spent executing statements to ``observe``.
+    Rows fetched after ``execute`` returns aren't included"""
+
+    observe = None
+
+    def execute(self, *args):
+        start = perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            self.observe("sql", perf_counter() - start)
+
+    def executemany(self, *args):
+        start = perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            self.observe("sql", perf_counter() - start)
+
+
+def to_prometheus(stats: Dict[str, dict], prefix: str = "kvsqlite") -> str:
+    """Format a ``stats()`` snapshot in the Prometheus text exposition format"""
+
+    lines = [
+        "# TYPE {}_queued_requests gauge".format(prefix),
+        "{}_queued_requests {}".format(prefix, stats["queued"]),
+    ]
+    for name in ("group_commit_pending", "write_behind_pending", "lazy_expiry_pending"):
+        if name in stats:
+            lines.append("# TYPE {}_{} gauge".format(prefix, name))
+            lines.append("{}_{} {}".format(prefix, name, stats[name]))
+
+    lines.append("# TYPE {}_requests_total counter".format(prefix))
+    for request, request_stats in stats["requests"].items():
+        lines.append(
+            '{}_requests_total{{request="{}"}} {}'.format(
+                prefix, request, request_stats["count"]
+            )
+        )
+
+    lines.append("# TYPE {}_request_errors_total counter".format(prefix))
+    for request, request_stats in stats["requests"].items():
+        lines.append(
+            '{}_request_errors_total{{request="{}"}} {}'.format(
+                prefix, request, request_stats["errors"]
+            )
+        )
+
+    lines.append("# TYPE {}_request_duration_seconds histogram".format(prefix))
+    for request, request_stats in stats["requests"].items():
+        for phase, histogram in request_stats["phases"].items():
+            labels = 'request="{}",phase="{}"'.format(request, phase)
+            for bound, count in histogram["buckets"].items():
+                lines.append(
+                    '{}_request_duration_seconds_bucket{{{},le="{}"}} {}'.format(
+                        prefix,
+                        labels,
+                        "+Inf" if bound == float("inf") else repr(bound),
+                        count,
+                    )
+                )
+            lines.append(
+                "{}_request_duration_seconds_sum{{{}}} {}".format(
+                    prefix, labels, histogram["sum"]
+                )
+            )
+            lines.append(
+                "{}_request_duration_seconds_count{{{}}} {}".format(
+                    prefix, labels, histogram["count"]
+                )
+            )
+
+    return "\n".join(lines) + "\n"
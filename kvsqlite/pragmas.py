@@ -0,0 +1,62 @@
+from typing import Dict, Union
+
+# Supported pragmas and their validators, see https://www.sqlite.org/pragma.html
+PRAGMAS = {
+    # Pages (or KiB when negative) of page cache per connection
+    "cache_size": lambda value: isinstance(value, int),
+    # Bytes of the database file memory-mapped for reads, 0 disables mmap
+    "mmap_size": lambda value: isinstance(value, int) and value >= 0,
+    "temp_store": lambda value: value in (0, 1, 2)
+    or (isinstance(value, str) and value.upper() in ("DEFAULT", "FILE", "MEMORY")),
+    # Changing the page size of an existing database requires a VACUUM
+    "page_size": lambda value: isinstance(value, int)
+    and 512 <= value <= 65536
+    and value & (value - 1) == 0,
+    # WAL pages before an automatic checkpoint, 0 disables automatic checkpoints
+    "wal_autocheckpoint": lambda value: isinstance(value, int) and value >= 0,
+    # Milliseconds to wait for a lock held by another connection or process
+    "busy_timeout": lambda value: isinstance(value, int) and value >= 0,
+}
+
+PRESETS = {
+    # Bigger page cache and memory-mapped reads
+    "read-heavy": {
+        "cache_size": -65536,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+    },
+    # Bigger page cache and less frequent checkpoints while loading lots of keys
+    "bulk-load": {
+        "cache_size": -262144,
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 10000,
+    },
+    # Wait for other processes locks instead of failing with "database is locked"
+    "multi-process": {
+        "busy_timeout": 30000,
+    },
+}
+
+
+def resolve_pragmas(pragmas: Union[str, Dict[str, Union[int, str]]]) -> dict:
+    """Return the validated pragmas of a preset name or a ``pragma`` to ``value`` mapping"""
+
+    if pragmas is None:
+        return {}
+
+    if isinstance(pragmas, str):
+        assert (
+            pragmas in PRESETS
+        ), "Unknown pragmas preset {}, expected one of {}".format(
+            pragmas, ", ".join(PRESETS)
+        )
+        return dict(PRESETS[pragmas])
+
+    assert isinstance(pragmas, dict), "pragmas must be str or dict"
+    for name, value in pragmas.items():
+        assert name in PRAGMAS, "Unsupported pragma {}".format(name)
+        assert PRAGMAS[name](value), "Invalid value {!r} for pragma {}".format(
+            value, name
+        )
+
+    return dict(pragmas)
@@ -0,0 +1,629 @@
+import argparse
+import asyncio
+import logging
+
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from time import monotonic
+from typing import Callable, Dict, List, Tuple
+from .encoders import BytesEncoder
+from .sqlite import Sqlite, REQUEST, glob_prefix
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from a connection at once. Every command complete in the buffer is
+# processed in one batch, so pipelined commands share a single worker round trip
+READ_SIZE = 65536
+
+# Limits of the request sizes, like Redis
+MAX_INLINE_SIZE = 65536
+MAX_BULK_SIZE = 536870912
+MAX_ARGUMENTS = 1048576
+
+# SCAN cursors are forgotten after CURSOR_TTL seconds, or when more than
+# MAX_CURSORS are open
+CURSOR_TTL = 600
+MAX_CURSORS = 100000
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class CommandError(Exception):
+    """Error replied to the client, ``message`` starts with the error code"""
+
+
+class Status(str):
+    """Simple string reply, e.g. ``OK``"""
+
+
+class Cursors:
+    """SCAN cursors shared by every connection, so pooled clients can continue a scan
+    on another connection. Cursors are small integers, as some clients expect"""
+
+    def __init__(self, ttl: float = CURSOR_TTL, size: int = MAX_CURSORS) -> None:
+        self.ttl = ttl
+        self.size = size
+        # cursor -> (the last key returned, expire time), oldest first
+        self.__cursors: Dict[int, Tuple[str, float]] = OrderedDict()
+        self.__next_cursor = 1
+
+    def add(self, key: str) -> int:
+        now = monotonic()
+        while self.__cursors and (
+            len(self.__cursors) >= self.size
+            or next(iter(self.__cursors.values()))[1] <= now
+        ):
+            self.__cursors.popitem(last=False)
+
+        cursor = self.__next_cursor
+        self.__next_cursor += 1
+        self.__cursors[cursor] = (key, now + self.ttl)
+        return cursor
+
+    def get(self, cursor: int) -> str:
+        """Return the last key returned before ``cursor``, it stays valid so a page can be read again"""
+
+        entry = self.__cursors.get(cursor)
+        if entry is None or entry[1] <= monotonic():
+            raise CommandError("ERR invalid cursor")
+        return entry[0]
+
+
+OK = Status("OK")
+
+
+def parse_command(buffer: bytearray, start: int = 0) -> Tuple[List[bytes], int]:
+    """Parse the command at ``start`` of ``buffer``
+
+    Returns:
+        The arguments of the command and the position after it, or ``None`` and ``start`` if the command is incomplete
+    """
+
+    line_end = buffer.find(b"\r\n", start)
+    if buffer[start] != ord("*"):
+        # Inline command, e.g. sent by telnet
+        if line_end < 0:
+            if len(buffer) - start > MAX_INLINE_SIZE:
+                raise ProtocolError("too big inline request")
+            return None, start
+        return bytes(buffer[start:line_end]).split(), line_end + 2
+
+    if line_end < 0:
+        return None, start
+
+    count = parse_length(buffer[start + 1 : line_end], MAX_ARGUMENTS, "multibulk")
+    position = line_end + 2
+    arguments = []
+    for _ in range(count):
+        line_end = buffer.find(b"\r\n", position)
+        if line_end < 0:
+            return None, start
+
+        if buffer[position] != ord("$"):
+            raise ProtocolError("expected '$', got '{}'".format(chr(buffer[position])))
+        length = parse_length(buffer[position + 1 : line_end], MAX_BULK_SIZE, "bulk")
+        position = line_end + 2
+        if len(buffer) < position + length + 2:
+            return None, start
+
+        arguments.append(bytes(buffer[position : position + length]))
+        position += length + 2
+
+    return arguments, position
+
+
+def parse_length(data: bytes, maximum: int, name: str) -> int:
+    try:
+        length = int(data)
+    except ValueError:
+        raise ProtocolError("invalid {} length".format(name))
+
+    if not 0 <= length <= maximum:
+        raise ProtocolError("invalid {} length".format(name))
+
+    return length
+
+
+def encode_reply(value, out: list):
+    """Append the RESP encoding of ``value`` to ``out``"""
+
+    if value is None:
+        out.append(b"$-1\r\n")
+    elif isinstance(value, Status):
+        out.append(b"+" + value.encode() + b"\r\n")
+    elif isinstance(value, CommandError):
+        out.append(b"-" + str(value).encode() + b"\r\n")
+    elif isinstance(value, (bool, int)):
+        out.append(b":%d\r\n" % value)
+    elif isinstance(value, list):
+        out.append(b"*%d\r\n" % len(value))
+        for item in value:
+            encode_reply(item, out)
+    else:
+        if isinstance(value, str):
+            value = value.encode()
+        out.append(b"$%d\r\n" % len(value))
+        out.append(value)
+        out.append(b"\r\n")
+
+
+def to_key(argument: bytes) -> str:
+    try:
+        return argument.decode()
+    except UnicodeDecodeError:
+        raise CommandError("ERR keys must be valid UTF-8")
+
+
+def to_int(argument: bytes) -> int:
+    try:
+        return int(argument)
+    except ValueError:
+        raise CommandError("ERR value is not an integer or out of range")
+
+
+def to_ttl(argument: bytes, command: str) -> int:
+    ttl = to_int(argument)
+    if ttl <= 0:
+        raise CommandError("ERR invalid expire time in '{}' command".format(command))
+    return ttl
+
+
+def first(results: list):
+    return results[0]
+
+
+def to_bulk(value):
+    """Return a stored ``value`` as a bulk string payload"""
+
+    # Values written by other encoders are replied as their text form, never
+    # as integers or arrays
+    if value is None or isinstance(value, (bytes, bytearray, memoryview, str)):
+        return value
+    return str(value).encode()
+
+
+# Each command returns the ``(request, key, value)`` requests it needs and a
+# function building its reply from their results
+
+
+def command_ping(cursors: Cursors, arguments: list):
+    return [], lambda results: arguments[1] if len(arguments) > 1 else Status("PONG")
+
+
+def command_echo(cursors: Cursors, arguments: list):
+    return [], lambda results: arguments[1]
+
+
+def command_command(cursors: Cursors, arguments: list):
+    # Only what redis-cli needs at startup
+    return [], lambda results: []
+
+
+def command_get(cursors: Cursors, arguments: list):
+    key = to_key(arguments[1])
+    return [(REQUEST.GET, key, None)], lambda results: to_bulk(results[0])
+
+
+def command_set(cursors: Cursors, arguments: list):
+    ttl = None
+    nx = False
+    options = iter(arguments[3:])
+    for option in options:
+        option = option.upper()
+        if option in (b"EX", b"PX") and ttl is None:
+            ttl = to_ttl(next(options, b""), "set")
+            if option == b"PX":
+                ttl /= 1000
+        elif option == b"NX":
+            nx = True
+        else:
+            raise CommandError("ERR syntax error")
+
+    key = to_key(arguments[1])
+    if nx:
+        return [(REQUEST.SETNX, key, [arguments[2], ttl])], lambda results: (
+            OK if results[0] else None
+        )
+    elif ttl is not None:
+        return [(REQUEST.SETEX, key, [arguments[2], ttl])], lambda results: OK
+
+    return [(REQUEST.SET, key, arguments[2])], lambda results: OK
+
+
+def command_setex(cursors: Cursors, arguments: list):
+    ttl = to_ttl(arguments[2], "setex")
+    return [(REQUEST.SETEX, to_key(arguments[1]), [arguments[3], ttl])], (
+        lambda results: OK
+    )
+
+
+def command_del(cursors: Cursors, arguments: list):
+    keys = [to_key(argument) for argument in arguments[1:]]
+    return [(REQUEST.MDELETE, keys, None)], first
+
+
+def command_exists(cursors: Cursors, arguments: list):
+    return [(REQUEST.EXISTS, to_key(argument), None) for argument in arguments[1:]], sum
+
+
+def command_pttl(cursors: Cursors, arguments: list):
+    key = to_key(arguments[1])
+
+    def reply(results):
+        ttl, exists = results
+        if ttl > 0:
+            return ttl
+        # -1 for keys without a timeout, -2 for missing keys
+        return -1 if exists else -2
+
+    return [(REQUEST.PTTL, key, None), (REQUEST.EXISTS, key, None)], reply
+
+
+def command_ttl(cursors: Cursors, arguments: list):
+    requests, reply = command_pttl(cursors, arguments)
+
+    def reply_seconds(results):
+        ttl = reply(results)
+        return ttl if ttl < 0 else (ttl + 500) // 1000
+
+    return requests, reply_seconds
+
+
+def command_expire(cursors: Cursors, arguments: list):
+    ttl = to_ttl(arguments[2], "expire")
+    return [(REQUEST.EXPIRE, to_key(arguments[1]), ttl)], first
+
+
+def command_rename(cursors: Cursors, arguments: list):
+    def reply(results):
+        if not results[0]:
+            return CommandError("ERR no such key")
+        return OK
+
+    # Like Redis, an existing new key is replaced
+    return [
+        (REQUEST.RENAME_OVERWRITE, to_key(arguments[1]), to_key(arguments[2]))
+    ], reply
+
+
+def command_keys(cursors: Cursors, arguments: list):
+    return [(REQUEST.KEYS_GLOB, None, to_key(arguments[1]))], first
+
+
+def command_scan(cursors: Cursors, arguments: list):
+    cursor = to_int(arguments[1])
+    after = cursors.get(cursor) if cursor != 0 else None
+
+    pattern = None
+    count = 10
+    options = iter(arguments[2:])
+    for option in options:
+        option = option.upper()
+        if option == b"MATCH":
+            pattern = to_key(next(options, b""))
+        elif option == b"COUNT":
+            count = to_int(next(options, b""))
+            if count < 1:
+                raise CommandError("ERR syntax error")
+        else:
+            raise CommandError("ERR syntax error")
+
+    # Pages are read in key order from the key after the previous page, the
+    # pattern prefix narrows them to an index range
+    prefix = glob_prefix(pattern) if pattern else ""
+
+    def reply(results):
+        keys = results[0]
+        next_cursor = 0
+        if len(keys) == count:
+            next_cursor = cursors.add(keys[-1])
+
+        if pattern:
+            keys = [key for key in keys if fnmatchcase(key, pattern)]
+        return [str(next_cursor), keys]
+
+    return [(REQUEST.SCAN, None, (prefix, after, count, False))], reply
+
+
+def command_mget(cursors: Cursors, arguments: list):
+    keys = [to_key(argument) for argument in arguments[1:]]
+    return [(REQUEST.MGET, keys, None)], lambda results: list(map(to_bulk, results[0]))
+
+
+def command_mset(cursors: Cursors, arguments: list):
+    if len(arguments) % 2 == 0:
+        raise CommandError("ERR wrong number of arguments for 'mset' command")
+
+    mapping = {
+        to_key(arguments[i]): arguments[i + 1] for i in range(1, len(arguments), 2)
+    }
+    return [(REQUEST.MSET, None, mapping)], lambda results: OK
+
+
+# Command name -> (function, arity). Like Redis, a negative arity is the
+# minimum number of arguments, including the command name
+COMMANDS: Dict[bytes, Tuple[Callable, int]] = {
+    b"PING": (command_ping, -1),
+    b"ECHO": (command_echo, 2),
+    b"COMMAND": (command_command, -1),
+    b"GET": (command_get, 2),
+    b"SET": (command_set, -3),
+    b"SETEX": (command_setex, 4),
+    b"DEL": (command_del, -2),
+    b"EXISTS": (command_exists, -2),
+    b"TTL": (command_ttl, 2),
+    b"PTTL": (command_pttl, 2),
+    b"EXPIRE": (command_expire, 3),
+    b"RENAME": (command_rename, 3),
+    b"KEYS": (command_keys, 2),
+    b"SCAN": (command_scan, -2),
+    b"MGET": (command_mget, -2),
+    b"MSET": (command_mset, -3),
+}
+
+
+class Server:
+    def __init__(
+        self,
+        database: str,
+        host: str = "127.0.0.1",
+        port: int = 6379,
+        table_name: str = "kvsqlite",
+        journal_mode: str = "WAL",
+        synchronous: str = "NORMAL",
+        workers: int = 2,
+        **options,
+    ) -> None:
+        """Kvsqlite server speaking the Redis protocol (RESP)
+
+        Commands pipelined by a client are processed in one batch. Values are stored with :class:`~kvsqlite.BytesEncoder`,
+        so they can be read by :class:`~kvsqlite.Client` instances using it too
+
+        Args:
+            database (``str``):
+                Sqlite3 database path.
+
+            host (``str``, *optional*):
+                The address to listen on. Defaults to ``127.0.0.1``.
+
+            port (``int``, *optional*):
+                The port to listen on. Defaults to ``6379``.
+
+            table_name (``str``, *optional*):
+                The table name to use. Defaults to ``kvsqlite``.
+
+            journal_mode (``str``, *optional*):
+                Sqlite3 journal mode. Defaults to ``WAL``.
+
+            synchronous (``str``, *optional*):
+                Sqlite3 synchronous mode. Defaults to ``NORMAL``.
+
+            workers (``int``, *optional*):
+                Thread workers count. Defaults to ``2``.
+
+            **options:
+                Other :class:`~kvsqlite.Client` options, e.g. ``cache_size``, ``reaper_interval`` or ``lazy_expiry``.
+        """
+
+        assert isinstance(host, str), "host must be str"
+        assert isinstance(port, int), "port must be int"
+
+        self.host = host
+        self.port = port
+        self.sqlite = Sqlite(
+            database,
+            table_name,
+            True,
+            journal_mode,
+            synchronous,
+            BytesEncoder(),
+            workers,
+            **options,
+        )
+
+        self.__server = None
+        self.__cursors = Cursors()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def start(self) -> asyncio.AbstractServer:
+        """Start listening, and return the :py:class:`asyncio.Server`"""
+
+        self.__server = await asyncio.start_server(
+            self.__handle_connection, self.host, self.port
+        )
+        for socket in self.__server.sockets:
+            logger.info("Listening on {}".format(socket.getsockname()))
+
+        return self.__server
+
+    async def serve_forever(self):
+        if self.__server is None:
+            await self.start()
+
+        await self.__server.serve_forever()
+
+    async def close(self):
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+
+        if self.sqlite.is_running:
+            await asyncio.wrap_future(self.sqlite.request(REQUEST.CLOSE, value=True))
+
+    async def __handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        buffer = bytearray()
+        try:
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    break
+                buffer += data
+
+                commands = []
+                position = 0
+                error = None
+                try:
+                    while position < len(buffer):
+                        arguments, position_after = parse_command(buffer, position)
+                        if arguments is None:
+                            break
+
+                        position = position_after
+                        if arguments:
+                            commands.append(arguments)
+                except ProtocolError as e:
+                    error = CommandError("ERR Protocol error: {}".format(e))
+                del buffer[:position]
+
+                out = []
+                quit = await self.__process(commands, out)
+                if error is not None:
+                    encode_reply(error, out)
+
+                writer.write(b"".join(out))
+                await writer.drain()
+
+                if quit or error is not None:
+                    break
+        except ConnectionError:
+            pass
+        except Exception:
+            logger.exception("Connection exception")
+        finally:
+            writer.close()
+
+    async def __process(self, commands: list, out: list) -> bool:
+        """Process ``commands`` in one batch, append their replies to ``out`` and return
+        whether the client sent ``QUIT``"""
+
+        quit = False
+        requests = []
+        replies = []
+        for arguments in commands:
+            name = arguments[0].upper()
+            if name == b"QUIT":
+                # Later commands are ignored
+                replies.append((0, lambda results: OK))
+                quit = True
+                break
+
+            try:
+                function, arity = COMMANDS.get(name, (None, 0))
+                if function is None:
+                    raise CommandError(
+                        "ERR unknown command '{}'".format(
+                            arguments[0].decode(errors="replace")
+                        )
+                    )
+                if (arity > 0 and len(arguments) != arity) or len(arguments) < -arity:
+                    raise CommandError(
+                        "ERR wrong number of arguments for '{}' command".format(
+                            name.decode().lower()
+                        )
+                    )
+
+                command_requests, reply = function(self.__cursors, arguments)
+            except CommandError as e:
+                replies.append((0, lambda results, e=e: e))
+                continue
+
+            requests.extend(command_requests)
+            replies.append((len(command_requests), reply))
+
+        results = []
+        if requests:
+            results = await asyncio.wrap_future(
+                self.sqlite.request(REQUEST.BATCH, value=requests)
+            )
+
+        position = 0
+        for count, reply in replies:
+            command_results = results[position : position + count]
+            position += count
+
+            exception = next(
+                (exception for _, exception in command_results if exception), None
+            )
+            if exception is not None:
+                value = CommandError("ERR {}".format(exception))
+            else:
+                value = reply([result for result, _ in command_results])
+            encode_reply(value, out)
+
+        return quit
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve a kvsqlite database over the Redis protocol"
+    )
+    parser.add_argument("database", help="Sqlite3 database path")
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Address to listen on (Defaults to 127.0.0.1)",
+    )
+    parser.add_argument(
+        "--port", type=int, default=6379, help="Port to listen on (Defaults to 6379)"
+    )
+    parser.add_argument(
+        "--table-name", default="kvsqlite", help="Table name (Defaults to kvsqlite)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=2, help="Thread workers count (Defaults to 2)"
+    )
+    parser.add_argument(
+        "--pragmas",
+        choices=["read-heavy", "bulk-load", "multi-process"],
+        help="Connection tuning preset",
+    )
+    parser.add_argument(
+        "--reaper-interval",
+        type=float,
+        help="Seconds between background runs deleting expired keys",
+    )
+    parser.add_argument(
+        "--lazy-expiry",
+        action="store_true",
+        help="Delete expired keys found by reads in the background",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+
+    async def serve():
+        server = Server(
+            args.database,
+            args.host,
+            args.port,
+            args.table_name,
+            workers=args.workers,
+            pragmas=args.pragmas,
+            reaper_interval=args.reaper_interval,
+            lazy_expiry=args.lazy_expiry,
+        )
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+import asyncio
+import heapq
+import json
+import logging
+import os
+
+from typing import Any, AsyncIterator, Callable, Dict, List, Tuple, Union
+from zlib import crc32
+from .client import Client
+from .base import BaseClient
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Hash functions must be stable across processes, so Python's hash() can't be used
+HASHES = {
+    "crc32": lambda key: crc32(key.encode("utf-8")),
+}
+
+
+def load_manifest(directory: str, shards: int = None, hash_name: str = None) -> dict:
+    """Load the manifest of a sharded store in ``directory``, or create it if not exists"""
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, MANIFEST_NAME)
+
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            manifest = json.load(f)
+
+        assert (
+            shards is None or shards == manifest["shards"]
+        ), "{} was created with {} shards, got {}".format(
+            directory, manifest["shards"], shards
+        )
+        assert (
+            hash_name is None or hash_name == manifest["hash"]
+        ), "{} was created with {} hash, got {}".format(
+            directory, manifest["hash"], hash_name
+        )
+    else:
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "shards": shards or 4,
+            "hash": hash_name or "crc32",
+        }
+
+        # Write the manifest atomically, a partial manifest would make the
+        # store unreadable
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(path + ".tmp", path)
+
+    assert manifest["hash"] in HASHES, "Unknown hash {}".format(manifest["hash"])
+    assert manifest["shards"] > 0, "shards must be greater than 0"
+
+    return manifest
+
+
+def shard_path(directory: str, index: int) -> str:
+    return os.path.join(directory, "shard-{}.sqlite".format(index))
+
+
+def group_by_shard(shard_of, keys) -> Dict[int, list]:
+    groups = {}
+    for key in keys:
+        groups.setdefault(shard_of(key), []).append(key)
+    return groups
+
+
+async def merge_async_iterators(iterators, key=None):
+    """Merge already sorted async iterators, like :func:`heapq.merge`"""
+
+    heap = []
+    for index, iterator in enumerate(iterators):
+        try:
+            item = await iterator.__anext__()
+        except StopAsyncIteration:
+            continue
+        heap.append((key(item) if key else item, index, item))
+    heapq.heapify(heap)
+
+    while heap:
+        _, index, item = heap[0]
+        yield item
+
+        try:
+            item = await iterators[index].__anext__()
+        except StopAsyncIteration:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (key(item) if key else item, index, item))
+
+
+class ShardedClient(BaseClient):
+    def __init__(
+        self,
+        directory: str,
+        shards: int = None,
+        hash_name: str = None,
+        **kwargs,
+    ):
+        """Kvsqlite asynchronous client which spreads keys across multiple database files.
+
+        SQLite allows one writer per database file, each shard has its own database file, writer connection and workers,
+        so writes to different shards run in parallel.
+
+        Args:
+            directory (``str``):
+                The directory of the shards databases, will be created if not exists.
+
+            shards (``int``, *optional*):
+                The number of shards. Defaults to the number stored in the store manifest, or ``4`` for new stores.
+
+            hash_name (``str``, *optional*):
+                The hash function used to map keys to shards, currently ``crc32``. Defaults to the one stored in the store manifest.
+
+            **kwargs:
+                Passed to each shard :class:`~kvsqlite.Client`.
+
+        .. note::
+            The number of shards and the hash function are stored in ``manifest.json`` inside ``directory``,
+            reopening a store with different values raises an error instead of losing keys.
+        """
+        assert isinstance(directory, str), "directory must be str"
+        assert shards is None or isinstance(shards, int), "shards must be int"
+        assert hash_name is None or isinstance(hash_name, str), "hash_name must be str"
+
+        manifest = load_manifest(directory, shards, hash_name)
+
+        self.directory = directory
+        self.shards = manifest["shards"]
+        self.hash_name = manifest["hash"]
+        self.__hash = HASHES[self.hash_name]
+
+        self.__clients = [
+            Client(shard_path(directory, index), **kwargs)
+            for index in range(self.shards)
+        ]
+
+        logger.debug(
+            "Opened {} shards in {} using {}".format(
+                self.shards, directory, self.hash_name
+            )
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        try:
+            await self.close()
+        except Exception:
+            logger.exception("Error on __aexit__")
+
+    def shard_of(self, key: str) -> int:
+        """Return the index of the shard which stores ``key``"""
+
+        return self.__hash(key) % self.shards
+
+    def client_of(self, key: str) -> Client:
+        """Return the shard :class:`~kvsqlite.Client` which stores ``key``"""
+
+        return self.__clients[self.shard_of(key)]
+
+    async def get(self, key: str) -> Any:
+        return await self.client_of(key).get(key)
+
+    async def set(self, key: str, value, encoder=None) -> bool:
+        return await self.client_of(key).set(key, value, encoder)
+
+    async def setex(self, key: str, ttl: int, value, encoder=None) -> bool:
+        return await self.client_of(key).setex(key, ttl, value, encoder)
+
+    async def delete(self, key: str) -> bool:
+        return await self.client_of(key).delete(key)
+
+    async def mget(self, keys: List[str]) -> List[Any]:
+        groups = group_by_shard(self.shard_of, keys)
+        results = await asyncio.gather(
+            *[self.__clients[index].mget(group) for index, group in groups.items()]
+        )
+
+        values = {}
+        for group, result in zip(groups.values(), results):
+            values.update(zip(group, result))
+        return [values[key] for key in keys]
+
+    async def mset(self, mapping: Dict[str, Any], encoder=None) -> bool:
+        groups = group_by_shard(self.shard_of, mapping)
+        results = await asyncio.gather(
+            *[
+                self.__clients[index].mset(
+                    {key: mapping[key] for key in group}, encoder
+                )
+                for index, group in groups.items()
+            ]
+        )
+        return all(results)
+
+    async def msetex(self, mapping: Dict[str, Any], ttl: int, encoder=None) -> bool:
+        groups = group_by_shard(self.shard_of, mapping)
+        results = await asyncio.gather(
+            *[
+                self.__clients[index].msetex(
+                    {key: mapping[key] for key in group}, ttl, encoder
+                )
+                for index, group in groups.items()
+            ]
+        )
+        return all(results)
+
+    async def mdelete(self, keys: List[str]) -> int:
+        groups = group_by_shard(self.shard_of, keys)
+        results = await asyncio.gather(
+            *[self.__clients[index].mdelete(group) for index, group in groups.items()]
+        )
+        return sum(results)
+
+    async def incr(self, key: str, by: int = 1) -> int:
+        return await self.client_of(key).incr(key, by)
+
+    async def decr(self, key: str, by: int = 1) -> int:
+        return await self.client_of(key).decr(key, by)
+
+    async def incrbyfloat(self, key: str, by: float = 1.0) -> float:
+        return await self.client_of(key).incrbyfloat(key, by)
+
+    async def setnx(self, key: str, value, ttl: int = None, encoder=None) -> bool:
+        return await self.client_of(key).setnx(key, value, ttl, encoder)
+
+    async def getset(self, key: str, value, encoder=None) -> Any:
+        return await self.client_of(key).getset(key, value, encoder)
+
+    async def getdel(self, key: str) -> Any:
+        return await self.client_of(key).getdel(key)
+
+    async def cas(self, key: str, expected, new, encoder=None) -> bool:
+        return await self.client_of(key).cas(key, expected, new, encoder)
+
+    async def commit(self) -> bool:
+        return all(await self.__fan_out("commit"))
+
+    async def exists(self, key: str) -> bool:
+        return await self.client_of(key).exists(key)
+
+    async def ttl(self, key: str) -> float:
+        return await self.client_of(key).ttl(key)
+
+    async def expire(self, key: str, ttl: int) -> bool:
+        return await self.client_of(key).expire(key, ttl)
+
+    async def pttl(self, key: str) -> int:
+        return await self.client_of(key).pttl(key)
+
+    async def expire_at(self, key: str, timestamp: Union[int, float]) -> bool:
+        return await self.client_of(key).expire_at(key, timestamp)
+
+    async def rename(self, key: str, new_key: str) -> bool:
+        """Rename ``key`` with ``new_key``
+
+        .. warning::
+            When ``key`` and ``new_key`` are stored in different shards, the rename is not atomic
+        """
+        source = self.client_of(key)
+        target = self.client_of(new_key)
+
+        if source is target:
+            return await source.rename(key, new_key)
+
+        if await target.exists(new_key):
+            return False
+
+        # The stored value is copied as is, with its type tag and expire time
+        dump = await source.dump(key)
+        if dump is None:
+            return False
+
+        await target.restore(new_key, dump)
+        await source.delete(key)
+        return True
+
+    async def dump(self, key: str) -> Union[Tuple[Any, int, int], None]:
+        return await self.client_of(key).dump(key)
+
+    async def restore(self, key: str, dump: Tuple[Any, int, int]) -> bool:
+        return await self.client_of(key).restore(key, dump)
+
+    async def keys(self, like: str = "%") -> Union[List[Tuple[str]], None]:
+        results = await self.__fan_out("keys", like)
+
+        keys = [key for result in results if result for key in result]
+        return keys or None
+
+    async def keys_prefix(self, prefix: str) -> List[str]:
+        return list(heapq.merge(*await self.__fan_out("keys_prefix", prefix)))
+
+    async def keys_range(self, start: str = None, end: str = None) -> List[str]:
+        return list(heapq.merge(*await self.__fan_out("keys_range", start, end)))
+
+    async def keys_glob(self, pattern: str) -> List[str]:
+        return list(heapq.merge(*await self.__fan_out("keys_glob", pattern)))
+
+    async def count(self, prefix: str = None) -> int:
+        return sum(await self.__fan_out("count", prefix))
+
+    async def scan(
+        self, prefix: str = None, batch_size: int = 1000
+    ) -> AsyncIterator[str]:
+        async for key in merge_async_iterators(
+            [client.scan(prefix, batch_size) for client in self.__clients]
+        ):
+            yield key
+
+    async def iter_items(
+        self, prefix: str = None, batch_size: int = 1000
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        async for item in merge_async_iterators(
+            [client.iter_items(prefix, batch_size) for client in self.__clients],
+            key=lambda item: item[0],
+        ):
+            yield item
+
+    async def flush_pending(self) -> int:
+        return sum(await self.__fan_out("flush_pending"))
+
+    async def cleanex(self) -> int:
+        return sum(await self.__fan_out("cleanex"))
+
+    async def flush(self) -> bool:
+        return all(await self.__fan_out("flush"))
+
+    def stats(self) -> List[Union[Dict[str, Any], None]]:
+        return [client.stats() for client in self.__clients]
+
+    def add_hook(self, before: Callable = None, after: Callable = None) -> None:
+        for client in self.__clients:
+            client.add_hook(before, after)
+
+    def remove_hook(self, before: Callable = None, after: Callable = None) -> None:
+        for client in self.__clients:
+            client.remove_hook(before, after)
+
+    def cache_info(self) -> List[Union[Dict[str, int], None]]:
+        return [client.cache_info() for client in self.__clients]
+
+    def reaper_info(self) -> List[Union[Dict[str, Union[int, float]], None]]:
+        return [client.reaper_info() for client in self.__clients]
+
+    async def close(self, optimize_database: bool = True) -> bool:
+        return all(await self.__fan_out("close", optimize_database))
+
+    async def __fan_out(self, method: str, *args) -> list:
+        return await asyncio.gather(
+            *[getattr(client, method)(*args) for client in self.__clients]
+        )
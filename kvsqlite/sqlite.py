@@ -1,10 +1,20 @@
 import sqlite3
 import logging
+import multiprocessing
+import re
+import sys
 
-from concurrent.futures import ThreadPoolExecutor
-from threading import Lock
+from contextlib import nullcontext
+from weakref import finalize
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from threading import Condition, Event, Lock, RLock, Thread, local
 from sys import version_info
-from time import time
+from time import monotonic, monotonic_ns, perf_counter, sleep, time_ns
+
+from .cache import LRUCache, MISSING
+from .encoders import DECODERS, NativeEncoder, type_tag
+from .pragmas import resolve_pragmas
+from .metrics import Metrics, TimedConnection, TimedLock
 
 logger = logging.getLogger(__name__)
 
@@ -18,11 +28,196 @@ class REQUEST:
     EXISTS = "EXISTS"
     TTL = "TTL"
     EXPIRE = "EXPIRE"
+    PTTL = "PTTL"
+    EXPIRE_AT = "EXPIRE_AT"
     RENAME = "RENAME"
     KEYS = "KEYS"
     CLEAN_EX = "CLEAN_EX"
     FLUSH_DB = "FLUSH_DB"
     CLOSE = "CLOSE"
+    MGET = "MGET"
+    MSET = "MSET"
+    MSETEX = "MSETEX"
+    MDELETE = "MDELETE"
+    SCAN = "SCAN"
+    KEYS_RANGE = "KEYS_RANGE"
+    KEYS_GLOB = "KEYS_GLOB"
+    COUNT = "COUNT"
+    INCR = "INCR"
+    SETNX = "SETNX"
+    GETSET = "GETSET"
+    GETDEL = "GETDEL"
+    CAS = "CAS"
+    FLUSH_PENDING = "FLUSH_PENDING"
+    BATCH = "BATCH"
+    RENAME_OVERWRITE = "RENAME_OVERWRITE"
+    DUMP = "DUMP"
+    RESTORE = "RESTORE"
+
+
+# Keep the number of bound parameters per statement below SQLITE_MAX_VARIABLE_NUMBER
+# (999 on SQLite < 3.32)
+CHUNK_SIZE = 900
+
+# Stored in ``PRAGMA user_version``. Version history:
+#   0: ``idx_lookup`` index on (k, expire_time)
+#   1: ``idx_lookup`` dropped (``k`` is already the primary key of a WITHOUT ROWID
+#      table), partial index on expire_time for expired keys lookups
+#   2: ``t`` column storing the type tag of the encoder which encoded ``v``,
+#      ``NULL`` for values only the default encoder can decode
+#   3: expire_time stored as integer milliseconds since the epoch instead of
+#      float seconds
+SCHEMA_VERSION = 3
+
+# Milliseconds a migration waits for the database to be unlocked, unless the
+# busy_timeout pragma is set
+MIGRATION_BUSY_TIMEOUT = 30000
+
+# RETURNING clauses are supported since SQLite 3.35
+RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Requests which are coalesced into a shared transaction in group-commit mode
+GROUP_COMMIT_REQUESTS = frozenset((REQUEST.SET, REQUEST.SETEX, REQUEST.DELETE))
+
+# Requests which are buffered in write-behind mode
+WRITE_BEHIND_REQUESTS = frozenset((REQUEST.SET, REQUEST.SETEX, REQUEST.DELETE))
+
+# Requests which don't need the write-behind buffer written first, every other
+# request sees the buffered writes in the database. Requests of a batch are
+# checked one by one
+WRITE_BEHIND_SKIP_FLUSH = frozenset(
+    (REQUEST.GET, REQUEST.FLUSH_PENDING, REQUEST.BATCH, *WRITE_BEHIND_REQUESTS)
+)
+
+
+def prefix_end(prefix: str):
+    """Return the smallest string greater than every string starting with ``prefix``,
+    or ``None`` if there is no such string (e.g. ``prefix`` is empty)"""
+
+    # SQLite compares TEXT as UTF-8 bytes, which sorts like the code points
+    for i in range(len(prefix) - 1, -1, -1):
+        code = ord(prefix[i])
+        if code < 0x10FFFF:
+            code += 1
+            if 0xD800 <= code <= 0xDFFF:
+                # Surrogates can't be encoded in UTF-8
+                code = 0xE000
+            return prefix[:i] + chr(code)
+
+    return None
+
+
+def glob_prefix(pattern: str):
+    """Return the literal part of a GLOB ``pattern`` before its first wildcard"""
+
+    for i, char in enumerate(pattern):
+        if char in "*?[":
+            return pattern[:i]
+
+    return pattern
+
+
+def expire_index_statement(table_name: str):
+    return 'CREATE INDEX IF NOT EXISTS "{}_expire_time" ON "{}" (expire_time) WHERE expire_time IS NOT NULL'.format(
+        table_name, table_name
+    )
+
+
+class Encoded:
+    """A value which was already encoded before reaching the writer"""
+
+    __slots__ = ("blob", "tag")
+
+    def __init__(self, blob, tag) -> None:
+        self.blob = blob
+        self.tag = tag
+
+
+class Typed:
+    """A value to encode with ``encoder`` instead of the default encoder"""
+
+    __slots__ = ("value", "encoder")
+
+    def __init__(self, value, encoder) -> None:
+        self.value = value
+        self.encoder = encoder
+
+
+class ReaderSlot:
+    """Thread-local holder of a read connection, finalized when its thread exits"""
+
+    __slots__ = ("connection", "__weakref__")
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.connection = connection
+
+
+class Clock:
+    """Wall clock in integer milliseconds, derived from the monotonic clock and resynced
+    with the system clock every ``resync`` milliseconds. It never goes backwards, so
+    keys don't come back to life when the system clock is adjusted"""
+
+    __slots__ = ("resync", "base")
+
+    def __init__(self, resync: int = 1000) -> None:
+        self.resync = resync
+        ticks = monotonic_ns() // 1000000
+        # (monotonic ticks of the last resync, wall clock - monotonic offset),
+        # replaced at once so threads never see half of a resync
+        self.base = (ticks, time_ns() // 1000000 - ticks)
+
+    def __call__(self) -> int:
+        ticks = monotonic_ns() // 1000000
+        synced, offset = self.base
+        if ticks - synced >= self.resync:
+            offset = max(time_ns() // 1000000, ticks + offset) - ticks
+            self.base = (ticks, offset)
+
+        return ticks + offset
+
+
+def expires_at(now: int, ttl) -> int:
+    """Return the expire time of a ``ttl`` seconds timeout, in milliseconds"""
+
+    return now + int(ttl * 1000)
+
+
+# String and blob literals of expanded statements, hidden when keys are redacted
+LITERAL_PATTERN = re.compile(r"[xX]?'(?:[^']|'')*'")
+
+
+def sizeof(value, limit: int = None) -> int:
+    """Return the approximate size of ``value`` in bytes, including the items of containers
+    and the attributes of objects. Counting stops once ``limit`` is reached"""
+
+    size = 0
+    seen = set()
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, (bytes, bytearray, memoryview, str)):
+            size += len(value)
+        elif id(value) not in seen:
+            seen.add(id(value))
+            size += sys.getsizeof(value)
+            if isinstance(value, dict):
+                stack.extend(value.keys())
+                stack.extend(value.values())
+            elif isinstance(value, (list, tuple, set, frozenset)):
+                stack.extend(value)
+            elif hasattr(value, "__dict__") and not isinstance(value, type):
+                stack.append(vars(value))
+
+        if limit is not None and size >= limit:
+            break
+
+    return size
+
+
+def encode_in_process(encoder, value) -> bytes:
+    # Encoders may return a memoryview (e.g. sqlite3.Binary), which can't be
+    # sent back to the parent process
+    return bytes(encoder.encode(value))
 
 
 class Sqlite:
@@ -35,47 +230,164 @@ class Sqlite:
         synchronous: str,
         encoder,
         workers: int,
+        group_commit: bool = False,
+        group_commit_delay: float = 0.002,
+        group_commit_size: int = 256,
+        read_pool: bool = True,
+        cache_size: int = 0,
+        cache_bytes: int = 0,
+        reaper_interval: float = None,
+        reaper_chunk: int = 1000,
+        encode_processes: int = 0,
+        encode_threshold: int = 1048576,
+        write_behind: bool = False,
+        write_behind_delay: float = 0.1,
+        write_behind_size: int = 1000,
+        pragmas: dict = None,
+        metrics: bool = False,
+        slow_threshold: float = None,
+        redact_keys: bool = False,
+        trace: bool = False,
+        lazy_expiry: bool = False,
     ) -> None:
         assert isinstance(database, str), "database must be str"
         assert isinstance(table_name, str), "table_name must be str"
         assert isinstance(autocommit, bool), "autocommit must be bool"
         assert isinstance(journal_mode, str), "journal_mode must be str"
         assert isinstance(synchronous, str), "synchronous must be str"
+        assert isinstance(group_commit, bool), "group_commit must be bool"
+        assert group_commit_delay >= 0, "group_commit_delay must be positive"
+        assert group_commit_size > 0, "group_commit_size must be greater than 0"
+        assert isinstance(read_pool, bool), "read_pool must be bool"
+        assert isinstance(cache_size, int), "cache_size must be int"
+        assert isinstance(cache_bytes, int), "cache_bytes must be int"
+        assert (
+            reaper_interval is None or reaper_interval > 0
+        ), "reaper_interval must be greater than 0"
+        # Without autocommit the reaper's deletes would open a transaction on
+        # the writer connection that only the user's next commit() ends
+        assert (
+            reaper_interval is None or autocommit
+        ), "reaper_interval requires autocommit"
+        assert isinstance(reaper_chunk, int), "reaper_chunk must be int"
+        assert reaper_chunk > 0, "reaper_chunk must be greater than 0"
+        assert isinstance(encode_processes, int), "encode_processes must be int"
+        assert isinstance(encode_threshold, int), "encode_threshold must be int"
+        assert isinstance(write_behind, bool), "write_behind must be bool"
+        assert write_behind_delay > 0, "write_behind_delay must be greater than 0"
+        assert write_behind_size > 0, "write_behind_size must be greater than 0"
+        assert isinstance(metrics, bool), "metrics must be bool"
+        assert (
+            slow_threshold is None or slow_threshold >= 0
+        ), "slow_threshold must be positive"
+        assert isinstance(redact_keys, bool), "redact_keys must be bool"
+        assert isinstance(trace, bool), "trace must be bool"
+        assert isinstance(lazy_expiry, bool), "lazy_expiry must be bool"
+        assert not lazy_expiry or autocommit, "lazy_expiry requires autocommit"
 
         self.database = database
         self.table_name = table_name
         self.autocommit = autocommit
         self.journal_mode = journal_mode
         self.synchronous = synchronous
+        self.pragmas = resolve_pragmas(pragmas)
         self.__encoder = encoder
+        self.__encoder_tag = type_tag(encoder)
+        self.__clock = Clock()
         self.__workers = ThreadPoolExecutor(workers, "kvsqlite")
-        self.__lock = Lock()
+        # Reentrant, so group-commit batches can run the regular handlers
+        # while holding the lock for the whole transaction
+        self.__lock = RLock()
+
+        self.slow_threshold = slow_threshold
+        self.redact_keys = redact_keys
+        self.trace = trace
+        # (before, after) pairs, replaced instead of mutated so requests can
+        # iterate over them without a lock
+        self.__hooks = ()
+
+        self.__metrics = Metrics() if metrics else None
+        if self.__metrics is not None or slow_threshold is not None:
+            self.__lock = TimedLock(self.__lock, self.__observe)
+
+        # Uninstrumented requests cost a single check
+        self.__measured = (
+            self.__metrics is not None or slow_threshold is not None or trace
+        )
 
         self.is_running = True
 
-        self.__table_statement = 'CREATE TABLE IF NOT EXISTS "{}" (k VARCHAR(4096) PRIMARY KEY, v BLOB, expire_time INTEGER DEFAULT NULL) WITHOUT ROWID'.format(
-            self.table_name
+        # Group commit only makes sense when each write would otherwise be
+        # committed on its own, write-behind already batches the writes
+        self.group_commit = group_commit and autocommit and not write_behind
+        self.group_commit_delay = group_commit_delay
+        self.group_commit_size = group_commit_size
+
+        # Separate read connections only see committed data, so they are used
+        # when every write is committed right away and WAL lets readers run
+        # alongside the writer. In-memory databases are private per connection
+        self.read_pool = (
+            read_pool
+            and autocommit
+            and journal_mode.upper() == "WAL"
+            and database not in ("", ":memory:")
         )
-        self.__index_statement = (
-            'CREATE INDEX IF NOT EXISTS idx_lookup ON "{}" (k, expire_time)'.format(
-                self.table_name
+        self.__local = local()
+        self.__readers = []
+        self.__readers_lock = Lock()
+
+        self.__cache = (
+            LRUCache(cache_size, cache_bytes) if cache_size or cache_bytes else None
+        )
+
+        self.reaper_interval = reaper_interval
+        self.reaper_chunk = reaper_chunk
+        self.lazy_expiry = lazy_expiry
+
+        self.encode_threshold = encode_threshold
+        self.__processes = (
+            ProcessPoolExecutor(
+                encode_processes, mp_context=multiprocessing.get_context("spawn")
             )
+            if encode_processes > 0
+            else None
+        )
+        self.write_behind = write_behind
+        self.write_behind_delay = write_behind_delay
+        self.write_behind_size = write_behind_size
+
+        self.__reaper_stats = {
+            "runs": 0,
+            "deleted": 0,
+            "last_deleted": 0,
+            "last_duration": 0.0,
+        }
+
+        self.__table_statement = 'CREATE TABLE IF NOT EXISTS "{}" (k VARCHAR(4096) PRIMARY KEY, v BLOB, expire_time INTEGER DEFAULT NULL, t INTEGER DEFAULT NULL) WITHOUT ROWID'.format(
+            self.table_name
         )
-        self.__get_statement = 'SELECT v FROM "{}" WHERE k = ? AND (expire_time IS NULL OR expire_time > ?) LIMIT 1'.format(
+        self.__get_statement = 'SELECT v, expire_time, t FROM "{}" WHERE k = ? AND (expire_time IS NULL OR expire_time > ?) LIMIT 1'.format(
             self.table_name
         )
         self.__set_statement = (
-            'REPLACE INTO "{}" (k, v, expire_time) VALUES(?,?,NULL)'.format(
+            'REPLACE INTO "{}" (k, v, expire_time, t) VALUES(?,?,NULL,?)'.format(
                 self.table_name
             )
         )
         self.__setex_statement = (
-            'REPLACE INTO "{}" (k, v, expire_time) VALUES(?,?,?)'.format(
+            'REPLACE INTO "{}" (k, v, expire_time, t) VALUES(?,?,?,?)'.format(
                 self.table_name
             )
         )
         self.__delete_statement = 'DELETE FROM "{}" WHERE k = ?'.format(self.table_name)
-        self.__exists_statement = 'SELECT EXISTS (SELECT 1 FROM "{}" WHERE k = ? LIMIT 1)'.format(
+        self.__exists_statement = 'SELECT EXISTS (SELECT 1 FROM "{}" WHERE k = ? AND (expire_time IS NULL OR expire_time > ?) LIMIT 1)'.format(
+            self.table_name
+        )
+        self.__expire_time_statement = 'SELECT expire_time FROM "{}" WHERE k = ?'.format(
+            self.table_name
+        )
+        # Keys written again since they were found expired are kept
+        self.__delete_expired_statement = 'DELETE FROM "{}" WHERE k = ? AND expire_time <= ?'.format(
             self.table_name
         )
         self.__ttl_statement = 'SELECT expire_time FROM "{}" WHERE k = ? AND expire_time > ? LIMIT 1'.format(
@@ -90,62 +402,374 @@ class Sqlite:
         self.__keys_statement = (
             'SELECT k FROM "{}" WHERE k LIKE ?'.format(self.table_name)
         )
+        self.__reap_statement = 'DELETE FROM "{}" WHERE k IN (SELECT k FROM "{}" WHERE expire_time IS NOT NULL AND expire_time <= ? LIMIT ?)'.format(
+            self.table_name, self.table_name
+        )
         self.__cleanex_statement = 'DELETE FROM "{}" WHERE expire_time IS NOT NULL AND expire_time <= ?'.format(
             self.table_name
         )
+        self.__mget_statement = 'SELECT k, v, expire_time, t FROM "{}" WHERE k IN ({}) AND (expire_time IS NULL OR expire_time > ?)'.format(
+            self.table_name, ",".join("?" * CHUNK_SIZE)
+        )
         self.__flush_db_statement = 'DROP TABLE "{}"'.format(self.table_name)
 
+        # Expired keys start over from the increment, like missing keys. The
+        # WHERE clause skips values which aren't stored natively as numbers
+        self.__incr_statement = """INSERT INTO "{}" (k, v, expire_time, t) VALUES(?,?,NULL,{})
+            ON CONFLICT (k) DO UPDATE SET
+                v = CASE WHEN expire_time <= ? THEN excluded.v ELSE v + excluded.v END,
+                expire_time = CASE WHEN expire_time <= ? THEN NULL ELSE expire_time END,
+                t = excluded.t
+            WHERE (t = {} AND typeof(v) IN ('integer', 'real')) OR expire_time <= ?""".format(
+            self.table_name, NativeEncoder.type_tag, NativeEncoder.type_tag
+        )
+        if RETURNING:
+            self.__incr_statement += " RETURNING v"
+        self.__row_statement = 'SELECT v, expire_time, t FROM "{}" WHERE k = ?'.format(
+            self.table_name
+        )
+        self.__incr_update_statement = 'UPDATE "{}" SET v = ?, t = {} WHERE k = ?'.format(
+            self.table_name, NativeEncoder.type_tag
+        )
+        self.__setnx_statement = """INSERT INTO "{}" (k, v, expire_time, t) VALUES(?,?,?,?)
+            ON CONFLICT (k) DO UPDATE SET v = excluded.v, expire_time = excluded.expire_time, t = excluded.t
+            WHERE expire_time <= ?""".format(
+            self.table_name
+        )
+        self.__getdel_statement = (
+            'DELETE FROM "{}" WHERE k = ? RETURNING v, expire_time, t'.format(
+                self.table_name
+            )
+        )
+        self.__cas_statement = 'UPDATE "{}" SET v = ?, t = ? WHERE k = ? AND v = ? AND t IS ? AND (expire_time IS NULL OR expire_time > ?)'.format(
+            self.table_name
+        )
+
+        # Every handler takes ``(key, value)`` so requests are dispatched
+        # with a single dict lookup
+        self.__handlers = {
+            REQUEST.GET: self.__get,
+            REQUEST.SET: self.__set,
+            REQUEST.SETEX: self.__setex,
+            REQUEST.DELETE: self.__delete,
+            REQUEST.COMMIT: self.__commit,
+            REQUEST.EXISTS: self.__exists,
+            REQUEST.TTL: self.__ttl,
+            REQUEST.EXPIRE: self.__expire,
+            REQUEST.PTTL: self.__pttl,
+            REQUEST.EXPIRE_AT: self.__expire_at,
+            REQUEST.RENAME: self.__rename,
+            REQUEST.KEYS: self.__keys,
+            REQUEST.CLEAN_EX: self.__clean_ex,
+            REQUEST.FLUSH_DB: self.__flush_db,
+            REQUEST.CLOSE: self.__close,
+            REQUEST.MGET: self.__mget,
+            REQUEST.MSET: self.__mset,
+            REQUEST.MSETEX: self.__msetex,
+            REQUEST.MDELETE: self.__mdelete,
+            REQUEST.SCAN: self.__scan,
+            REQUEST.KEYS_RANGE: self.__keys_range,
+            REQUEST.KEYS_GLOB: self.__keys_glob,
+            REQUEST.COUNT: self.__count,
+            REQUEST.INCR: self.__incr,
+            REQUEST.SETNX: self.__setnx,
+            REQUEST.GETSET: self.__getset,
+            REQUEST.GETDEL: self.__getdel,
+            REQUEST.CAS: self.__cas,
+            REQUEST.FLUSH_PENDING: self.__flush_pending,
+            REQUEST.BATCH: self.__batch,
+            REQUEST.RENAME_OVERWRITE: self.__rename_overwrite,
+            REQUEST.DUMP: self.__dump,
+            REQUEST.RESTORE: self.__restore,
+        }
+
         self.__connection: sqlite3.Connection = self.__connect()
 
+        if self.group_commit:
+            self.__pending = []
+            self.__pending_condition = Condition()
+            self.__committing = True
+            self.__committer = Thread(
+                target=self.__group_commit_loop,
+                name="kvsqlite-group-commit",
+                daemon=True,
+            )
+            self.__committer.start()
+
+        if self.write_behind:
+            # key -> (blob, tag, expire_time), or None for deleted keys
+            self.__buffer = {}
+            self.__buffer_condition = Condition()
+            self.__buffering = True
+            self.__handlers[REQUEST.SET] = self.__buffer_set
+            self.__handlers[REQUEST.SETEX] = self.__buffer_setex
+            self.__handlers[REQUEST.DELETE] = self.__buffer_delete
+            self.__flusher = Thread(
+                target=self.__write_behind_loop,
+                name="kvsqlite-write-behind",
+                daemon=True,
+            )
+            self.__flusher.start()
+
+        if self.reaper_interval is not None:
+            self.__reaper_stop = Event()
+            self.__reaper = Thread(
+                target=self.__reaper_loop, name="kvsqlite-reaper", daemon=True
+            )
+            self.__reaper.start()
+
+        if self.lazy_expiry:
+            # Expired keys found by reads, deleted in batches by a background
+            # thread instead of on the read path
+            self.__expired = set()
+            self.__expired_condition = Condition()
+            self.__expiring = True
+            self.__expirer = Thread(
+                target=self.__lazy_expiry_loop,
+                name="kvsqlite-lazy-expiry",
+                daemon=True,
+            )
+            self.__expirer.start()
+
     def request(self, request, key: str = None, value=None):
+        if self.group_commit and self.__committing and request in GROUP_COMMIT_REQUESTS:
+            with self.__pending_condition:
+                # The committer may have been stopped since the check above,
+                # a write queued now would never be resolved
+                if self.__committing:
+                    future = Future()
+                    self.__pending.append((future, request, key, value))
+
+                    pending = len(self.__pending)
+                    if pending == 1 or pending >= self.group_commit_size:
+                        self.__pending_condition.notify()
+                    return future
+
+        if self.__metrics is not None:
+            self.__metrics.enqueue()
+            return self.__workers.submit(
+                self.__dequeue, perf_counter(), request, key, value
+            )
+
         return self.__workers.submit(self.procces_request, request, key, value)
 
+    def execute(self, request, key: str = None, value=None):
+        """Process ``request`` in the calling thread and return its result"""
+
+        if self.group_commit and self.__committing and request in GROUP_COMMIT_REQUESTS:
+            # Still wait for the shared transaction, otherwise the write
+            # would be committed on its own
+            return self.request(request, key, value).result()
+
+        return self.procces_request(request, key, value)
+
+    def reaper_info(self):
+        """Return the background reaper counters, or ``None`` if the reaper is disabled"""
+
+        if self.reaper_interval is not None:
+            return dict(self.__reaper_stats)
+
+    def stats(self):
+        """Return the requests metrics, or ``None`` if metrics are disabled"""
+
+        if self.__metrics is not None:
+            stats = self.__metrics.snapshot()
+            if self.group_commit:
+                stats["group_commit_pending"] = len(self.__pending)
+            if self.write_behind:
+                stats["write_behind_pending"] = len(self.__buffer)
+            if self.lazy_expiry:
+                stats["lazy_expiry_pending"] = len(self.__expired)
+            return stats
+
+    def add_hook(self, before=None, after=None):
+        """Call ``before(request, key)`` before each request, and ``after(request, key, context, duration, exception)``
+        after it, where ``context`` is the value returned by ``before``. Hooks run in the thread processing the request"""
+
+        assert before is not None or after is not None, "before or after is required"
+        self.__hooks = self.__hooks + ((before, after),)
+        self.__measured = True
+
+    def remove_hook(self, before=None, after=None):
+        self.__hooks = tuple(
+            hook for hook in self.__hooks if hook != (before, after)
+        )
+
+    def cache_info(self):
+        """Return the cache counters, or ``None`` if the cache is disabled"""
+
+        if self.__cache is not None:
+            return self.__cache.info()
+
     def procces_request(self, request, key: str = None, value=None):
         if not self.is_running:
             raise RuntimeError("Database is closed")
 
-        logger.debug("Request={}, key={}".format(request, key))
-
-        if request == REQUEST.GET:
-            return self.__get(key)
-        elif request == REQUEST.SET:
-            return self.__set(key, value)
-        elif request == REQUEST.SETEX:
-            return self.__setex(key, value)
-        elif request == REQUEST.DELETE:
-            return self.__delete(key)
-        elif request == REQUEST.COMMIT:
-            return self.__commit()
-        elif request == REQUEST.EXISTS:
-            return self.__exists(key)
-        elif request == REQUEST.TTL:
-            return self.__ttl(key)
-        elif request == REQUEST.EXPIRE:
-            return self.__expire(key, value)
-        elif request == REQUEST.RENAME:
-            return self.__rename(key, value)
-        elif request == REQUEST.KEYS:
-            return self.__keys(value)
-        elif request == REQUEST.CLEAN_EX:
-            return self.__clean_ex()
-        elif request == REQUEST.FLUSH_DB:
-            return self.__flush_db()
-        elif request == REQUEST.CLOSE:
-            return self.__close(value)
-        else:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Request={}, key={}".format(request, key))
+
+        handler = self.__handlers.get(request)
+        if handler is None:
             raise ValueError("Unknown request {}".format(request))
 
-    def __connect(self):
+        if self.__measured:
+            return self.__measure(request, handler, key, value)
+
+        if (
+            self.write_behind
+            and self.__buffer
+            and request not in WRITE_BEHIND_SKIP_FLUSH
+        ):
+            self.__flush_pending()
+
+        return handler(key, value)
+
+    def __dequeue(self, queued: float, request, key: str = None, value=None):
+        self.__metrics.dequeue(request, perf_counter() - queued)
+        return self.procces_request(request, key, value)
+
+    def __measure(self, request, handler, key: str = None, value=None):
+        # Phases measured while processing the request are reported to it,
+        # requests may be nested (e.g. group-commit batches)
+        local = self.__local
+        previous = (
+            getattr(local, "request", None),
+            getattr(local, "lock_wait", None),
+            getattr(local, "statements", None),
+        )
+        local.request = request
+        local.lock_wait = 0.0
+        local.statements = [] if self.trace else None
+
+        hooks = self.__hooks
+        contexts = [self.__call_hook(before, request, key) for before, _ in hooks]
+
+        start = perf_counter()
+        error = None
         try:
-            if self.autocommit:
+            if (
+                self.write_behind
+                and self.__buffer
+                and request not in WRITE_BEHIND_SKIP_FLUSH
+            ):
+                self.__flush_pending()
+
+            return handler(key, value)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            duration = perf_counter() - start
+            if self.__metrics is not None:
+                self.__metrics.finish(request, duration, error is not None)
+
+            if self.slow_threshold is not None and duration >= self.slow_threshold:
+                self.__log_slow(request, key, duration, local.lock_wait)
+
+            for (_, after), context in zip(hooks, contexts):
+                self.__call_hook(after, request, key, context, duration, error)
+
+            local.request, local.lock_wait, local.statements = previous
+
+    def __call_hook(self, hook, *args):
+        if hook is None:
+            return None
+
+        try:
+            return hook(*args)
+        except Exception:
+            # A broken hook must not break requests
+            logger.exception("Hook {!r} exception".format(hook))
+
+    def __log_slow(self, request, key, duration: float, lock_wait: float):
+        if isinstance(key, list):
+            key = "<{} keys>".format(len(key))
+        elif key is not None and self.redact_keys:
+            key = "<redacted>"
+
+        message = "Slow {} request, key={}, took {:.3f}s ({:.3f}s waiting for the writer lock)".format(
+            request, key, duration, lock_wait
+        )
+
+        # EXPLAIN statements are traced too, stop capturing before running them
+        statements, self.__local.statements = self.__local.statements, None
+        if statements:
+            with self.__lock if not self.read_pool else nullcontext():
+                connection = self.__reader()
+                for statement in statements:
+                    message += "\n  {}".format(self.__format_statement(statement))
+                    plan = self.__query_plan(connection, statement)
+                    if plan:
+                        message += "\n    plan: {}".format(plan)
+
+        logger.warning(message)
+
+    def __format_statement(self, statement: str) -> str:
+        # Bound values are expanded in traced statements
+        statement = " ".join(statement.split())
+        if self.redact_keys:
+            statement = LITERAL_PATTERN.sub("?", statement)
+
+        return statement if len(statement) <= 500 else statement[:500] + "..."
+
+    def __query_plan(self, connection: sqlite3.Connection, statement: str):
+        if not statement.lstrip().upper().startswith(
+            ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE")
+        ):
+            return None
+
+        try:
+            return "; ".join(
+                row[-1]
+                for row in connection.execute("EXPLAIN QUERY PLAN " + statement)
+            )
+        except sqlite3.Error:
+            return None
+
+    def __trace(self, statement: str):
+        statements = getattr(self.__local, "statements", None)
+        if statements is not None:
+            statements.append(statement)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("SQL: {}".format(self.__format_statement(statement)))
+
+    def __observe(self, phase: str, seconds: float):
+        if phase == "lock":
+            lock_wait = getattr(self.__local, "lock_wait", None)
+            if lock_wait is not None:
+                self.__local.lock_wait = lock_wait + seconds
+
+        if self.__metrics is not None:
+            request = getattr(self.__local, "request", None)
+            if request is not None:
+                self.__metrics.observe(request, phase, seconds)
+
+    def __connect(self, readonly: bool = False):
+        try:
+            factory = sqlite3.Connection if self.__metrics is None else TimedConnection
+            if readonly or self.autocommit:
                 connection = sqlite3.connect(
-                    self.database, isolation_level=None, check_same_thread=False
+                    self.database,
+                    isolation_level=None,
+                    check_same_thread=False,
+                    factory=factory,
                 )
             else:
-                connection = sqlite3.connect(self.database, check_same_thread=False)
+                connection = sqlite3.connect(
+                    self.database, check_same_thread=False, factory=factory
+                )
+
+            if self.__metrics is not None:
+                connection.observe = self.__observe
+            if self.trace:
+                connection.set_trace_callback(self.__trace)
 
             # connection.row_factory = sqlite3.Row
-            logger.info("Connected to {}".format(self.database))
+            if readonly:
+                logger.debug("Opened read connection to {}".format(self.database))
+            else:
+                logger.info("Connected to {}".format(self.database))
         except Exception as e:
             logger.exception(
                 "Error while opening sqlite3 for database: {}".format(self.database)
@@ -155,10 +779,22 @@ class Sqlite:
         try:
             connection.execute("PRAGMA journal_mode = {}".format(self.journal_mode))
             connection.execute("PRAGMA synchronous = {}".format(self.synchronous))
+            # Applied to every connection, including the read pool ones
+            for name, value in self.pragmas.items():
+                if name != "page_size":
+                    connection.execute("PRAGMA {} = {}".format(name, value))
+
+            if readonly:
+                connection.execute("PRAGMA query_only = ON")
+            elif "page_size" in self.pragmas:
+                self.__set_page_size(connection, self.pragmas["page_size"])
         except Exception as e:
             logger.exception("Error while executing PRAGMA statement")
             raise e
 
+        if readonly:
+            return connection
+
         try:
             self.__check_table(connection)
         except Exception as e:
@@ -167,14 +803,78 @@ class Sqlite:
 
         return connection
 
-    def __get(self, key: str):
+    def __set_page_size(self, connection: sqlite3.Connection, page_size: int):
+        if connection.execute("PRAGMA page_size").fetchone()[0] == page_size:
+            return
+
+        # The page size of a WAL database can't be changed, and existing pages
+        # are only rewritten by VACUUM
+        connection.execute("PRAGMA journal_mode = DELETE")
+        connection.execute("PRAGMA page_size = {}".format(page_size))
+        connection.execute("VACUUM")
+        connection.execute("PRAGMA journal_mode = {}".format(self.journal_mode))
+
+        logger.info("Changed {} page size to {}".format(self.database, page_size))
+
+    def __reader(self) -> sqlite3.Connection:
+        if not self.read_pool:
+            return self.__connection
+
+        slot = getattr(self.__local, "reader", None)
+        if slot is None:
+            slot = self.__local.reader = ReaderSlot(self.__connect(readonly=True))
+            with self.__readers_lock:
+                self.__readers.append(slot.connection)
+            # Thread-local data is dropped when its thread exits, so short-lived
+            # callers (e.g. fast path reads) don't leave their connection open
+            finalize(slot, self.__release_reader, slot.connection)
+
+        return slot.connection
+
+    def __release_reader(self, connection: sqlite3.Connection):
+        with self.__readers_lock:
+            if connection not in self.__readers:
+                # Already closed by close()
+                return
+            self.__readers.remove(connection)
+
+        connection.close()
+
+    def __get(self, key: str, value=None):
         try:
-            query = self.__connection.execute(
-                self.__get_statement,
-                (key, time()),
-            ).fetchone()
+            now = self.__clock()
+            if self.write_behind:
+                with self.__buffer_condition:
+                    entry = self.__buffer.get(key, MISSING)
+                if entry is not MISSING:
+                    if entry is None or (entry[2] is not None and entry[2] <= now):
+                        return None
+                    return self.__decode(entry[0], entry[1])
+
+            if self.__cache is not None:
+                value = self.__cache.get(key, now)
+                if value is not MISSING:
+                    return value
+                generation = self.__cache.generation
+
+            connection = self.__reader()
+            if self.lazy_expiry:
+                query = connection.execute(self.__row_statement, (key,)).fetchone()
+                if query and query[1] is not None and query[1] <= now:
+                    self.__expire_lazily(key)
+                    query = None
+            else:
+                query = connection.execute(
+                    self.__get_statement,
+                    (key, now),
+                ).fetchone()
             if query:
-                return self.__encoder.decode(query[0])
+                value = self.__decode(query[0], query[2])
+                if self.__cache is not None:
+                    self.__cache.put(
+                        key, value, query[1], sizeof(query[0]), generation
+                    )
+                return value
             else:
                 return None
         except Exception as e:
@@ -182,42 +882,47 @@ class Sqlite:
             raise e
 
     def __set(self, key: str, value):
-        with self.__lock:
-            try:
+        try:
+            blob, tag = self.__encode(value)
+            with self.__lock:
                 query = self.__connection.execute(
                     self.__set_statement,
-                    (key, self.__encoder.encode(value)),
+                    (key, blob, tag),
                 )
-                if query.rowcount > 0:
-                    return True
-                else:
-                    return False
-            except Exception as e:
-                logger.exception("SET command exception")
-                raise e
+                self.__invalidate(key)
+            if query.rowcount > 0:
+                return True
+            else:
+                return False
+        except Exception as e:
+            logger.exception("SET command exception")
+            raise e
 
     def __setex(self, key: str, value):
-        with self.__lock:
-            try:
+        try:
+            blob, tag = self.__encode(value[0])
+            with self.__lock:
                 query = self.__connection.execute(
                     self.__setex_statement,
-                    (key, self.__encoder.encode(value[0]), time() + value[1]),
+                    (key, blob, expires_at(self.__clock(), value[1]), tag),
                 )
-                if query.rowcount > 0:
-                    return True
-                else:
-                    return False
-            except Exception as e:
-                logger.exception("SETEX command exception")
-                raise e
+                self.__invalidate(key)
+            if query.rowcount > 0:
+                return True
+            else:
+                return False
+        except Exception as e:
+            logger.exception("SETEX command exception")
+            raise e
 
-    def __delete(self, key: str):
+    def __delete(self, key: str, value=None):
         with self.__lock:
             try:
                 query = self.__connection.execute(
                     self.__delete_statement,
                     (key,),
                 )
+                self.__invalidate(key)
                 if query.rowcount > 0:
                     return True
                 else:
@@ -226,7 +931,7 @@ class Sqlite:
                 logger.exception("DELETE command exception")
                 raise e
 
-    def __commit(self):
+    def __commit(self, key=None, value=None):
         with self.__lock:
             try:
                 self.__connection.commit()
@@ -235,11 +940,24 @@ class Sqlite:
                 logger.exception("COMMIT command exception")
                 raise e
 
-    def __exists(self, key: str):
+    def __exists(self, key: str, value=None):
         try:
-            query = self.__connection.execute(
+            now = self.__clock()
+            connection = self.__reader()
+            if self.lazy_expiry:
+                query = connection.execute(
+                    self.__expire_time_statement, (key,)
+                ).fetchone()
+                if query is None:
+                    return False
+                elif query[0] is not None and query[0] <= now:
+                    self.__expire_lazily(key)
+                    return False
+                return True
+
+            query = connection.execute(
                 self.__exists_statement,
-                (key,),
+                (key, now),
             ).fetchone()
 
             return bool(query[0])
@@ -247,15 +965,20 @@ class Sqlite:
             logger.exception("EXISTS command exception")
             raise e
 
-    def __ttl(self, key: str):
+    def __ttl(self, key: str, value=None):
+        return self.__pttl(key) / 1000
+
+    def __pttl(self, key: str, value=None):
         try:
-            query = self.__connection.execute(
+            now = self.__clock()
+            connection = self.__reader()
+            query = connection.execute(
                 self.__ttl_statement,
-                (key, time()),
+                (key, now),
             ).fetchone()
 
             if query:
-                return query[0] - time()
+                return query[0] - now
             else:
                 return 0
         except Exception as e:
@@ -263,12 +986,16 @@ class Sqlite:
             raise e
 
     def __expire(self, key: str, ttl: int):
+        return self.__expire_at(key, expires_at(self.__clock(), ttl))
+
+    def __expire_at(self, key: str, timestamp: int):
         with self.__lock:
             try:
                 query = self.__connection.execute(
                     self.__expire_statement,
-                    (time() + ttl, key),
+                    (timestamp, key),
                 )
+                self.__invalidate(key)
 
                 if query.rowcount > 0:
                     return True
@@ -279,23 +1006,77 @@ class Sqlite:
                 raise e
 
     def __rename(self, key: str, new_key: str):
+        with self.__lock:
+            try:
+                query = self.__connection.execute(
+                    self.__rename_statement,
+                    (new_key, key),
+                )
+                self.__invalidate(key, new_key)
+
+                if query.rowcount > 0:
+                    return True
+                else:
+                    return False
+            except Exception as e:
+                logger.exception("RENAME command exception")
+                raise e
+
+    def __rename_overwrite(self, key: str, new_key: str):
+        """Rename ``key`` like Redis ``RENAME``, replacing ``new_key`` if it exists"""
+
+        with self.__lock:
+            try:
+                renamed = self.__transaction(self.__move, key, new_key)
+                self.__invalidate(key, new_key)
+                return renamed
+            except Exception as e:
+                logger.exception("RENAME_OVERWRITE command exception")
+                raise e
+
+    def __move(self, key: str, new_key: str):
+        row = self.__connection.execute(
+            self.__expire_time_statement, (key,)
+        ).fetchone()
+        if row is None or (row[0] is not None and row[0] <= self.__clock()):
+            return False
+
+        if key != new_key:
+            self.__connection.execute(self.__delete_statement, (new_key,))
+            self.__connection.execute(self.__rename_statement, (new_key, key))
+        return True
+
+    def __dump(self, key: str, value=None):
         try:
-            query = self.__connection.execute(
-                self.__rename_statement,
-                (new_key, key),
-            )
+            connection = self.__reader()
+            row = connection.execute(self.__row_statement, (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= self.__clock()):
+                return None
 
-            if query.rowcount > 0:
-                return True
-            else:
-                return False
+            return row
+        except Exception as e:
+            logger.exception("DUMP command exception")
+            raise e
+
+    def __restore(self, key: str, row):
+        try:
+            v, expire_time, t = row
+            with self.__lock:
+                query = self.__connection.execute(
+                    self.__setex_statement,
+                    (key, v, expire_time, t),
+                )
+                self.__invalidate(key)
+
+            return query.rowcount > 0
         except Exception as e:
-            logger.exception("RENAME command exception")
+            logger.exception("RESTORE command exception")
             raise e
 
-    def __keys(self, like: str):
+    def __keys(self, key, like: str):
         try:
-            query = self.__connection.execute(
+            connection = self.__reader()
+            query = connection.execute(
                 self.__keys_statement,
                 (like,),
             ).fetchall()
@@ -307,12 +1088,12 @@ class Sqlite:
             logger.exception("KEYS command exception")
             raise e
 
-    def __clean_ex(self):
+    def __clean_ex(self, key=None, value=None):
         with self.__lock:
             try:
                 query = self.__connection.execute(
                     self.__cleanex_statement,
-                    (time(),),
+                    (self.__clock(),),
                 )
 
                 return query.rowcount
@@ -320,23 +1101,309 @@ class Sqlite:
                 logger.exception("CLEAN_EX command exception")
                 raise e
 
-    def __flush_db(self):
+    def __flush_db(self, key=None, value=None):
         with self.__lock:
             try:
                 self.__connection.execute(self.__flush_db_statement)
                 self.__connection.execute(self.__table_statement)
-                self.__connection.execute(self.__index_statement)
+                self.__connection.execute(expire_index_statement(self.table_name))
+                if self.__cache is not None:
+                    self.__cache.clear()
                 return True
             except Exception as e:
                 logger.exception("FLUSH_DB command exception")
                 raise e
 
-    def __close(self, optimize: bool):
+    def __group_commit_loop(self):
+        if self.__metrics is not None:
+            # Encoding and the shared transaction of each batch
+            self.__local.request = "GROUP_COMMIT"
+
+        while True:
+            with self.__pending_condition:
+                while not self.__pending and self.__committing:
+                    self.__pending_condition.wait()
+
+                if not self.__pending:
+                    return
+
+                deadline = monotonic() + self.group_commit_delay
+                while (
+                    len(self.__pending) < self.group_commit_size and self.__committing
+                ):
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        break
+                    self.__pending_condition.wait(remaining)
+
+                batch = self.__pending[: self.group_commit_size]
+                del self.__pending[: self.group_commit_size]
+
+            self.__commit_batch(batch)
+
+    def __commit_batch(self, batch: list):
+        # Encode before taking the lock, so it's only held for the statements
+        prepared = []
+        for future, request, key, value in batch:
+            try:
+                if request == REQUEST.SET:
+                    value = Encoded(*self.__encode(value))
+                elif request == REQUEST.SETEX:
+                    value = [Encoded(*self.__encode(value[0])), value[1]]
+            except Exception as e:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(e)
+                continue
+            prepared.append((future, request, key, value))
+        batch = prepared
+
+        results = []
+        with self.__lock:
+            try:
+                self.__connection.execute("BEGIN")
+                for future, request, key, value in batch:
+                    if not future.set_running_or_notify_cancel():
+                        results.append(None)
+                        continue
+
+                    try:
+                        results.append(
+                            (self.procces_request(request, key, value), None)
+                        )
+                    except Exception as e:
+                        results.append((None, e))
+                self.__connection.execute("COMMIT")
+            except Exception as e:
+                logger.exception("Group commit exception")
+                if self.__connection.in_transaction:
+                    self.__connection.execute("ROLLBACK")
+
+                for future, *_ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+        # Readers may have cached a value between the write and the shared
+        # commit, so invalidate again now that the writes are visible
+        self.__invalidate(*(key for _, _, key, _ in batch))
+
+        # Callers are only notified once the shared transaction is durable
+        for (future, *_), result in zip(batch, results):
+            if result is None:
+                continue
+            elif result[1] is not None:
+                future.set_exception(result[1])
+            else:
+                future.set_result(result[0])
+
+    def __buffer_set(self, key: str, value):
+        blob, tag = self.__encode(value)
+        return self.__buffer_write(key, (blob, tag, None))
+
+    def __buffer_setex(self, key: str, value):
+        blob, tag = self.__encode(value[0])
+        return self.__buffer_write(
+            key, (blob, tag, expires_at(self.__clock(), value[1]))
+        )
+
+    def __buffer_delete(self, key: str, value=None):
+        return self.__buffer_write(key, None)
+
+    def __buffer_write(self, key: str, entry):
+        with self.__buffer_condition:
+            # Overwrites of the same key before the next flush replace each
+            # other, so only the latest one is written
+            self.__buffer[key] = entry
+
+            buffered = len(self.__buffer)
+            if buffered == 1 or buffered >= self.write_behind_size:
+                self.__buffer_condition.notify()
+        self.__invalidate(key)
+        return True
+
+    def __write_behind_loop(self):
+        if self.__metrics is not None:
+            self.__local.request = "WRITE_BEHIND"
+
+        while True:
+            with self.__buffer_condition:
+                while not self.__buffer and self.__buffering:
+                    self.__buffer_condition.wait()
+
+                if not self.__buffering:
+                    # close() writes what's left
+                    return
+
+                deadline = monotonic() + self.write_behind_delay
+                while len(self.__buffer) < self.write_behind_size and self.__buffering:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        break
+                    self.__buffer_condition.wait(remaining)
+
+            try:
+                self.__flush_pending()
+            except Exception:
+                logger.exception("Write-behind flush exception")
+
+    def __flush_pending(self, key=None, value=None):
+        if not self.write_behind:
+            return 0
+
+        # The writer lock is held from the snapshot until the entries are
+        # removed, so an older snapshot is never written after a newer one
+        with self.__lock:
+            with self.__buffer_condition:
+                entries = list(self.__buffer.items())
+            if not entries:
+                return 0
+
+            rows = []
+            deleted = []
+            for k, entry in entries:
+                if entry is None:
+                    deleted.append((k,))
+                else:
+                    rows.append((k, entry[0], entry[2], entry[1]))
+
+            try:
+                self.__transaction(self.__write_entries, rows, deleted)
+            except Exception as e:
+                logger.exception("FLUSH_PENDING command exception")
+                raise e
+
+            # Entries stay readable from the buffer until they are written,
+            # then only the ones which weren't overwritten meanwhile are removed
+            with self.__buffer_condition:
+                for k, entry in entries:
+                    if self.__buffer.get(k, MISSING) is entry:
+                        del self.__buffer[k]
+
+        return len(entries)
+
+    def __write_entries(self, rows: list, deleted: list):
+        if rows:
+            self.__connection.executemany(self.__setex_statement, rows)
+        if deleted:
+            self.__connection.executemany(self.__delete_statement, deleted)
+
+    def __stop_group_commit(self):
+        with self.__pending_condition:
+            self.__committing = False
+            self.__pending_condition.notify()
+        self.__committer.join()
+
+    def __expire_lazily(self, key: str):
+        with self.__expired_condition:
+            self.__expired.add(key)
+            if len(self.__expired) == 1:
+                self.__expired_condition.notify()
+
+    def __lazy_expiry_loop(self):
+        if self.__metrics is not None:
+            self.__local.request = "LAZY_EXPIRY"
+
+        while True:
+            with self.__expired_condition:
+                while not self.__expired and self.__expiring:
+                    self.__expired_condition.wait()
+
+                if not self.__expiring:
+                    # close() deletes what's left
+                    return
+
+                keys = self.__expired
+                self.__expired = set()
+
+            try:
+                self.__delete_expired(keys)
+            except Exception:
+                logger.exception("Lazy expiry exception")
+
+    def __delete_expired(self, keys):
+        now = self.__clock()
+        keys = list(keys)
+        deleted = 0
+        for i in range(0, len(keys), self.reaper_chunk):
+            with self.__lock:
+                deleted += self.__executemany(
+                    self.__delete_expired_statement,
+                    [(key, now) for key in keys[i : i + self.reaper_chunk]],
+                )
+
+        if deleted:
+            logger.debug("Lazy expiry deleted {} expired keys".format(deleted))
+
+    def __reaper_loop(self):
+        if self.__metrics is not None:
+            self.__local.request = "REAPER"
+
+        while not self.__reaper_stop.wait(self.reaper_interval):
+            try:
+                self.__reap()
+            except Exception:
+                logger.exception("Reaper exception")
+
+    def __reap(self):
+        start = monotonic()
+        deleted = 0
+        while not self.__reaper_stop.is_set():
+            # Each chunk is its own short write, so foreground writes can
+            # take the lock between chunks instead of waiting for the whole run
+            with self.__lock:
+                query = self.__connection.execute(
+                    self.__reap_statement, (self.__clock(), self.reaper_chunk)
+                )
+            deleted += query.rowcount
+
+            if query.rowcount < self.reaper_chunk:
+                break
+            sleep(0)
+
+        duration = monotonic() - start
+        self.__reaper_stats["runs"] += 1
+        self.__reaper_stats["deleted"] += deleted
+        self.__reaper_stats["last_deleted"] = deleted
+        self.__reaper_stats["last_duration"] = duration
+
+        if deleted:
+            logger.info(
+                "Reaper deleted {} expired keys in {:.3f}s".format(deleted, duration)
+            )
+
+    def __close(self, key, optimize: bool):
+        if self.group_commit:
+            # Drain pending writes before the connection goes away
+            self.__stop_group_commit()
+
+        if self.write_behind:
+            with self.__buffer_condition:
+                self.__buffering = False
+                self.__buffer_condition.notify()
+            self.__flusher.join()
+            self.__flush_pending()
+
+        if self.reaper_interval is not None:
+            self.__reaper_stop.set()
+            self.__reaper.join()
+
+        if self.lazy_expiry:
+            with self.__expired_condition:
+                self.__expiring = False
+                self.__expired_condition.notify()
+            self.__expirer.join()
+            self.__delete_expired(self.__expired)
+
         with self.__lock:
             try:
                 if optimize:
                     self.__connection.execute("PRAGMA optimize")
                 self.__connection.close()
+
+                with self.__readers_lock:
+                    for connection in self.__readers:
+                        connection.close()
+                    self.__readers.clear()
                 logger.info("Connection to {} closed".format(self.database))
 
                 if version_info.minor > 8:
@@ -344,14 +1411,442 @@ class Sqlite:
                 else:
                     self.__workers.shutdown(False)
 
+                if self.__processes is not None:
+                    self.__processes.shutdown(False)
+
                 self.is_running = False
                 return True
             except Exception as e:
                 logger.exception("CLOSE command exception")
                 raise e
 
+    def __mget(self, keys: list, value=None):
+        try:
+            now = self.__clock()
+            found = {}
+            if self.__cache is not None:
+                generation = self.__cache.generation
+                for key in keys:
+                    value = self.__cache.get(key, now)
+                    if value is not MISSING:
+                        found[key] = value
+                missing = [key for key in keys if key not in found]
+            else:
+                missing = keys
+
+            connection = self.__reader()
+            for i in range(0, len(missing), CHUNK_SIZE):
+                chunk = missing[i : i + CHUNK_SIZE]
+                if len(chunk) == CHUNK_SIZE:
+                    statement = self.__mget_statement
+                else:
+                    statement = 'SELECT k, v, expire_time, t FROM "{}" WHERE k IN ({}) AND (expire_time IS NULL OR expire_time > ?)'.format(
+                        self.table_name, ",".join("?" * len(chunk))
+                    )
+
+                for k, v, expire_time, t in connection.execute(
+                    statement, (*chunk, now)
+                ):
+                    found[k] = self.__decode(v, t)
+                    if self.__cache is not None:
+                        self.__cache.put(
+                            k, found[k], expire_time, sizeof(v), generation
+                        )
+
+            return [found.get(key) for key in keys]
+        except Exception as e:
+            logger.exception("MGET command exception")
+            raise e
+
+    def __mset(self, key, mapping: dict):
+        try:
+            rows = [(k, *self.__encode(v)) for k, v in mapping.items()]
+            with self.__lock:
+                self.__executemany(self.__set_statement, rows)
+                self.__invalidate(*mapping)
+            return True
+        except Exception as e:
+            logger.exception("MSET command exception")
+            raise e
+
+    def __msetex(self, key, value):
+        try:
+            mapping, ttl = value
+            expire = expires_at(self.__clock(), ttl)
+            rows = []
+            for k, v in mapping.items():
+                blob, tag = self.__encode(v)
+                rows.append((k, blob, expire, tag))
+            with self.__lock:
+                self.__executemany(self.__setex_statement, rows)
+                self.__invalidate(*mapping)
+            return True
+        except Exception as e:
+            logger.exception("MSETEX command exception")
+            raise e
+
+    def __mdelete(self, keys: list, value=None):
+        with self.__lock:
+            try:
+                deleted = self.__executemany(
+                    self.__delete_statement, [(key,) for key in keys]
+                )
+                self.__invalidate(*keys)
+                return deleted
+            except Exception as e:
+                logger.exception("MDELETE command exception")
+                raise e
+
+    def __incr(self, key: str, amount):
+        with self.__lock:
+            try:
+                now = self.__clock()
+                query = self.__connection.execute(
+                    self.__incr_statement, (key, amount, now, now, now)
+                )
+                if RETURNING:
+                    # Fetch every row, so the statement is done before the lock is released
+                    rows = query.fetchall()
+                    updated = bool(rows)
+                else:
+                    updated = query.rowcount > 0
+                    if updated:
+                        rows = self.__connection.execute(
+                            self.__row_statement, (key,)
+                        ).fetchall()
+
+                if updated:
+                    value = rows[0][0]
+                else:
+                    value = self.__incr_encoded(key, amount)
+
+                self.__invalidate(key)
+                return value
+            except Exception as e:
+                logger.exception("INCR command exception")
+                raise e
+
+    def __incr_encoded(self, key: str, amount):
+        # The key holds a value written by an encoder (e.g. a pickled counter),
+        # it's converted to a native number so next increments take the fast path
+        v, expire_time, t = self.__connection.execute(
+            self.__row_statement, (key,)
+        ).fetchone()
+
+        value = self.__decode(v, t)
+        if type(value) not in (int, float):
+            raise TypeError("The value of {} is not a number".format(key))
+
+        value += amount
+        self.__connection.execute(self.__incr_update_statement, (value, key))
+        return value
+
+    def __setnx(self, key: str, value):
+        try:
+            blob, tag = self.__encode(value[0])
+            with self.__lock:
+                now = self.__clock()
+                # Expired keys are replaced, like missing keys
+                query = self.__connection.execute(
+                    self.__setnx_statement,
+                    (
+                        key,
+                        blob,
+                        None if value[1] is None else expires_at(now, value[1]),
+                        tag,
+                        now,
+                    ),
+                )
+                if query.rowcount > 0:
+                    self.__invalidate(key)
+                    return True
+                else:
+                    return False
+        except Exception as e:
+            logger.exception("SETNX command exception")
+            raise e
+
+    def __getset(self, key: str, value):
+        try:
+            blob, tag = self.__encode(value)
+            with self.__lock:
+                row = self.__transaction(self.__replace, key, blob, tag)
+                self.__invalidate(key)
+            return self.__live_value(row)
+        except Exception as e:
+            logger.exception("GETSET command exception")
+            raise e
+
+    def __getdel(self, key: str, value=None):
+        with self.__lock:
+            try:
+                if RETURNING:
+                    row = self.__pop(key)
+                else:
+                    row = self.__transaction(self.__pop, key)
+                self.__invalidate(key)
+                return self.__live_value(row)
+            except Exception as e:
+                logger.exception("GETDEL command exception")
+                raise e
+
+    def __cas(self, key: str, value):
+        try:
+            expected, expected_tag = self.__encode(value[0])
+            blob, tag = self.__encode(value[1])
+            with self.__lock:
+                # Values are compared by their encoded form, in one statement
+                query = self.__connection.execute(
+                    self.__cas_statement,
+                    (blob, tag, key, expected, expected_tag, self.__clock()),
+                )
+                if query.rowcount > 0:
+                    self.__invalidate(key)
+                    return True
+                else:
+                    return False
+        except Exception as e:
+            logger.exception("CAS command exception")
+            raise e
+
+    def __batch(self, key, requests: list):
+        """Process ``(request, key, value)`` requests in order and return their ``(result, exception)``"""
+
+        results = []
+        for request, key, value in requests:
+            try:
+                results.append((self.procces_request(request, key, value), None))
+            except Exception as e:
+                results.append((None, e))
+
+        return results
+
+    def __pop(self, key: str):
+        """Delete ``key`` and return its ``(v, expire_time, t)`` row, or ``None``"""
+
+        if RETURNING:
+            # Fetch every row, so the statement is done before returning
+            rows = self.__connection.execute(self.__getdel_statement, (key,)).fetchall()
+            return rows[0] if rows else None
+
+        row = self.__connection.execute(self.__row_statement, (key,)).fetchone()
+        self.__connection.execute(self.__delete_statement, (key,))
+        return row
+
+    def __replace(self, key: str, blob, tag):
+        row = self.__pop(key)
+        self.__connection.execute(self.__set_statement, (key, blob, tag))
+        return row
+
+    def __live_value(self, row):
+        # Expired rows are still deleted or replaced, but weren't readable
+        if row is None or (row[1] is not None and row[1] <= self.__clock()):
+            return None
+
+        return self.__decode(row[0], row[2])
+
+    def __scan(self, key, value):
+        try:
+            prefix, after, batch_size, with_values = value
+
+            # Keyset pagination: each page starts right after the last key of
+            # the previous page, so it's served from the primary key index
+            where, parameters = self.__key_range(
+                prefix, prefix_end(prefix) if prefix else None, after
+            )
+            parameters.append(batch_size)
+
+            connection = self.__reader()
+            query = connection.execute(
+                'SELECT k{} FROM "{}" WHERE {} ORDER BY k LIMIT ?'.format(
+                    ", v, t" if with_values else "", self.table_name, where
+                ),
+                parameters,
+            )
+
+            if with_values:
+                return [(k, self.__decode(v, t)) for k, v, t in query]
+            else:
+                return [row[0] for row in query]
+        except Exception as e:
+            logger.exception("SCAN command exception")
+            raise e
+
+    def __keys_range(self, key, value):
+        try:
+            where, parameters = self.__key_range(*value)
+
+            connection = self.__reader()
+            query = connection.execute(
+                'SELECT k FROM "{}" WHERE {} ORDER BY k'.format(self.table_name, where),
+                parameters,
+            )
+
+            return [row[0] for row in query]
+        except Exception as e:
+            logger.exception("KEYS_RANGE command exception")
+            raise e
+
+    def __keys_glob(self, key, pattern: str):
+        try:
+            # Bounding GLOB by its literal prefix guarantees an index range scan
+            prefix = glob_prefix(pattern)
+            where, parameters = self.__key_range(
+                prefix, prefix_end(prefix) if prefix else None
+            )
+            parameters.append(pattern)
+
+            connection = self.__reader()
+            query = connection.execute(
+                'SELECT k FROM "{}" WHERE {} AND k GLOB ? ORDER BY k'.format(
+                    self.table_name, where
+                ),
+                parameters,
+            )
+
+            return [row[0] for row in query]
+        except Exception as e:
+            logger.exception("KEYS_GLOB command exception")
+            raise e
+
+    def __count(self, key, prefix: str):
+        try:
+            where, parameters = self.__key_range(
+                prefix, prefix_end(prefix) if prefix else None
+            )
+
+            connection = self.__reader()
+            query = connection.execute(
+                'SELECT COUNT(*) FROM "{}" WHERE {}'.format(self.table_name, where),
+                parameters,
+            ).fetchone()
+
+            return query[0]
+        except Exception as e:
+            logger.exception("COUNT command exception")
+            raise e
+
+    def __key_range(self, start: str = None, end: str = None, after: str = None):
+        # Bounds on the primary key let SQLite seek to the first matching key
+        # instead of scanning the whole table like LIKE does
+        conditions = []
+        parameters = []
+        if after is not None:
+            conditions.append("k > ?")
+            parameters.append(after)
+        elif start:
+            conditions.append("k >= ?")
+            parameters.append(start)
+
+        if end is not None:
+            conditions.append("k < ?")
+            parameters.append(end)
+
+        conditions.append("(expire_time IS NULL OR expire_time > ?)")
+        parameters.append(self.__clock())
+
+        return " AND ".join(conditions), parameters
+
+    def __encode(self, value):
+        """Return the blob and the type tag to store for ``value``"""
+
+        if self.__metrics is None or type(value) is Encoded:
+            return self.__encode_value(value)
+
+        start = perf_counter()
+        try:
+            return self.__encode_value(value)
+        finally:
+            self.__observe("codec", perf_counter() - start)
+
+    def __encode_value(self, value):
+        if type(value) is Encoded:
+            return value.blob, value.tag
+
+        encoder = self.__encoder
+        tag = self.__encoder_tag
+        if type(value) is Typed:
+            encoder = value.encoder
+            tag = type_tag(encoder)
+            value = value.value
+
+        if (
+            self.__processes is not None
+            and tag != NativeEncoder.type_tag
+            and sizeof(value, self.encode_threshold) >= self.encode_threshold
+        ):
+            # Large values are encoded in another process, so CPU heavy encoders
+            # don't hold the GIL while other requests are waiting
+            return (
+                self.__processes.submit(encode_in_process, encoder, value).result(),
+                tag,
+            )
+
+        return encoder.encode(value), tag
+
+    def __decode(self, blob, tag):
+        if self.__metrics is None:
+            return self.__decode_value(blob, tag)
+
+        start = perf_counter()
+        try:
+            return self.__decode_value(blob, tag)
+        finally:
+            self.__observe("codec", perf_counter() - start)
+
+    def __decode_value(self, blob, tag):
+        if tag is None:
+            return self.__encoder.decode(blob)
+
+        decoder = DECODERS.get(tag)
+        if decoder is None:
+            raise ValueError("Unknown type tag {}".format(tag))
+
+        return decoder.decode(blob)
+
+    def __invalidate(self, *keys: str):
+        if self.__cache is not None:
+            self.__cache.invalidate(*keys)
+
+    def __executemany(self, statement: str, rows: list):
+        # Commit the whole batch only once
+        query = self.__transaction(self.__connection.executemany, statement, rows)
+
+        return query.rowcount
+
+    def __transaction(self, function, *args):
+        # Under autocommit every statement is its own transaction, so wrap the
+        # statements of ``function`` in one explicit transaction
+        if not self.autocommit:
+            return function(*args)
+
+        self.__connection.execute("BEGIN")
+        try:
+            result = function(*args)
+            self.__connection.execute("COMMIT")
+        except BaseException:
+            self.__connection.execute("ROLLBACK")
+            raise
+
+        return result
+
     def __check_table(self, connection: sqlite3.Connection):
         try:
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                # Wait for other connections to release the database instead
+                # of failing right away
+                busy_timeout = connection.execute("PRAGMA busy_timeout").fetchone()[0]
+                connection.execute(
+                    "PRAGMA busy_timeout = {}".format(
+                        self.pragmas.get("busy_timeout", MIGRATION_BUSY_TIMEOUT)
+                    )
+                )
+                try:
+                    self.__migrate(connection)
+                finally:
+                    connection.execute("PRAGMA busy_timeout = {}".format(busy_timeout))
+
             table_exists = (
                 connection.execute(
                     "SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?",
@@ -372,9 +1867,85 @@ class Sqlite:
                             self.table_name
                         )
                     )
+                    connection.execute(expire_index_statement(self.table_name))
+
+                if "t" not in columns:
+                    connection.execute(
+                        "ALTER TABLE '{}' ADD COLUMN t INTEGER DEFAULT NULL".format(
+                            self.table_name
+                        )
+                    )
             else:
                 connection.execute(self.__table_statement)
-                connection.execute(self.__index_statement)
+                connection.execute(expire_index_statement(self.table_name))
 
-        except Exception:
+        except Exception as e:
+            # Opening the database on an outdated schema would misread values
             logger.exception("Check table error")
+            raise e
+
+    def __migrate(self, connection: sqlite3.Connection):
+        # user_version belongs to the database file, so every kvsqlite table
+        # in the file is migrated at once
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                connection.execute("COMMIT")
+                return
+
+            tables = []
+            for name, sql in connection.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'table'"
+            ).fetchall():
+                columns = [
+                    row[1]
+                    for row in connection.execute(
+                        'PRAGMA table_info("{}")'.format(name)
+                    ).fetchall()
+                ]
+                if name == self.table_name or (
+                    "k" in columns
+                    and "v" in columns
+                    and "WITHOUT ROWID" in (sql or "").upper()
+                ):
+                    tables.append((name, columns))
+
+            if version < 1:
+                connection.execute("DROP INDEX IF EXISTS idx_lookup")
+                for name, columns in tables:
+                    if "expire_time" not in columns:
+                        connection.execute(
+                            'ALTER TABLE "{}" ADD COLUMN expire_time INTEGER DEFAULT NULL'.format(
+                                name
+                            )
+                        )
+                    connection.execute(expire_index_statement(name))
+
+            if version < 2:
+                for name, columns in tables:
+                    if "t" not in columns:
+                        connection.execute(
+                            'ALTER TABLE "{}" ADD COLUMN t INTEGER DEFAULT NULL'.format(
+                                name
+                            )
+                        )
+
+            if version < 3:
+                for name, columns in tables:
+                    connection.execute(
+                        'UPDATE "{}" SET expire_time = CAST(ROUND(expire_time * 1000) AS INTEGER) WHERE expire_time IS NOT NULL'.format(
+                            name
+                        )
+                    )
+
+            connection.execute("PRAGMA user_version = {}".format(SCHEMA_VERSION))
+            connection.execute("COMMIT")
+            logger.info(
+                "Migrated {} from schema version {} to {}".format(
+                    self.database, version, SCHEMA_VERSION
+                )
+            )
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
@@ -1,3 +1,4 @@
-__all__ = ["Client"]
+__all__ = ["Client", "ShardedClient"]
 
 from .client import Client
+from .sharded import ShardedClient
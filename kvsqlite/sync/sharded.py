@@ -0,0 +1,287 @@
+import heapq
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
+from .client import Client
+from ..base import BaseClient
+from ..sharded import HASHES, group_by_shard, load_manifest, shard_path
+
+logger = logging.getLogger(__name__)
+
+
+class ShardedClient(BaseClient):
+    def __init__(
+        self,
+        directory: str,
+        shards: int = None,
+        hash_name: str = None,
+        **kwargs,
+    ):
+        """Kvsqlite synchronous client which spreads keys across multiple database files.
+
+        SQLite allows one writer per database file, each shard has its own database file, writer connection and workers,
+        so requests spanning multiple shards run in parallel.
+
+        Args:
+            directory (``str``):
+                The directory of the shards databases, will be created if not exists.
+
+            shards (``int``, *optional*):
+                The number of shards. Defaults to the number stored in the store manifest, or ``4`` for new stores.
+
+            hash_name (``str``, *optional*):
+                The hash function used to map keys to shards, currently ``crc32``. Defaults to the one stored in the store manifest.
+
+            **kwargs:
+                Passed to each shard :class:`~kvsqlite.sync.Client`.
+
+        .. note::
+            The number of shards and the hash function are stored in ``manifest.json`` inside ``directory``,
+            reopening a store with different values raises an error instead of losing keys.
+        """
+        assert isinstance(directory, str), "directory must be str"
+        assert shards is None or isinstance(shards, int), "shards must be int"
+        assert hash_name is None or isinstance(hash_name, str), "hash_name must be str"
+
+        manifest = load_manifest(directory, shards, hash_name)
+
+        self.directory = directory
+        self.shards = manifest["shards"]
+        self.hash_name = manifest["hash"]
+        self.__hash = HASHES[self.hash_name]
+
+        self.__clients = [
+            Client(shard_path(directory, index), **kwargs)
+            for index in range(self.shards)
+        ]
+        self.__workers = ThreadPoolExecutor(self.shards, "kvsqlite-shards")
+
+        logger.debug(
+            "Opened {} shards in {} using {}".format(
+                self.shards, directory, self.hash_name
+            )
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self.close()
+        except Exception:
+            logger.exception("Error on __exit__")
+
+    def shard_of(self, key: str) -> int:
+        """Return the index of the shard which stores ``key``"""
+
+        return self.__hash(key) % self.shards
+
+    def client_of(self, key: str) -> Client:
+        """Return the shard :class:`~kvsqlite.sync.Client` which stores ``key``"""
+
+        return self.__clients[self.shard_of(key)]
+
+    def get(self, key: str) -> Any:
+        return self.client_of(key).get(key)
+
+    def set(self, key: str, value, encoder=None) -> bool:
+        return self.client_of(key).set(key, value, encoder)
+
+    def setex(self, key: str, ttl: int, value, encoder=None) -> bool:
+        return self.client_of(key).setex(key, ttl, value, encoder)
+
+    def delete(self, key: str) -> bool:
+        return self.client_of(key).delete(key)
+
+    def mget(self, keys: List[str]) -> List[Any]:
+        groups = group_by_shard(self.shard_of, keys)
+        results = self.__parallel(
+            [(self.__clients[index].mget, (group,)) for index, group in groups.items()]
+        )
+
+        values = {}
+        for group, result in zip(groups.values(), results):
+            values.update(zip(group, result))
+        return [values[key] for key in keys]
+
+    def mset(self, mapping: Dict[str, Any], encoder=None) -> bool:
+        groups = group_by_shard(self.shard_of, mapping)
+        results = self.__parallel(
+            [
+                (
+                    self.__clients[index].mset,
+                    ({key: mapping[key] for key in group}, encoder),
+                )
+                for index, group in groups.items()
+            ]
+        )
+        return all(results)
+
+    def msetex(self, mapping: Dict[str, Any], ttl: int, encoder=None) -> bool:
+        groups = group_by_shard(self.shard_of, mapping)
+        results = self.__parallel(
+            [
+                (
+                    self.__clients[index].msetex,
+                    ({key: mapping[key] for key in group}, ttl, encoder),
+                )
+                for index, group in groups.items()
+            ]
+        )
+        return all(results)
+
+    def mdelete(self, keys: List[str]) -> int:
+        groups = group_by_shard(self.shard_of, keys)
+        results = self.__parallel(
+            [
+                (self.__clients[index].mdelete, (group,))
+                for index, group in groups.items()
+            ]
+        )
+        return sum(results)
+
+    def incr(self, key: str, by: int = 1) -> int:
+        return self.client_of(key).incr(key, by)
+
+    def decr(self, key: str, by: int = 1) -> int:
+        return self.client_of(key).decr(key, by)
+
+    def incrbyfloat(self, key: str, by: float = 1.0) -> float:
+        return self.client_of(key).incrbyfloat(key, by)
+
+    def setnx(self, key: str, value, ttl: int = None, encoder=None) -> bool:
+        return self.client_of(key).setnx(key, value, ttl, encoder)
+
+    def getset(self, key: str, value, encoder=None) -> Any:
+        return self.client_of(key).getset(key, value, encoder)
+
+    def getdel(self, key: str) -> Any:
+        return self.client_of(key).getdel(key)
+
+    def cas(self, key: str, expected, new, encoder=None) -> bool:
+        return self.client_of(key).cas(key, expected, new, encoder)
+
+    def commit(self) -> bool:
+        return all(self.__fan_out("commit"))
+
+    def exists(self, key: str) -> bool:
+        return self.client_of(key).exists(key)
+
+    def ttl(self, key: str) -> float:
+        return self.client_of(key).ttl(key)
+
+    def expire(self, key: str, ttl: int) -> bool:
+        return self.client_of(key).expire(key, ttl)
+
+    def pttl(self, key: str) -> int:
+        return self.client_of(key).pttl(key)
+
+    def expire_at(self, key: str, timestamp: Union[int, float]) -> bool:
+        return self.client_of(key).expire_at(key, timestamp)
+
+    def rename(self, key: str, new_key: str) -> bool:
+        """Rename ``key`` with ``new_key``
+
+        .. warning::
+            When ``key`` and ``new_key`` are stored in different shards, the rename is not atomic
+        """
+        source = self.client_of(key)
+        target = self.client_of(new_key)
+
+        if source is target:
+            return source.rename(key, new_key)
+
+        if target.exists(new_key):
+            return False
+
+        # The stored value is copied as is, with its type tag and expire time
+        dump = source.dump(key)
+        if dump is None:
+            return False
+
+        target.restore(new_key, dump)
+        source.delete(key)
+        return True
+
+    def dump(self, key: str) -> Union[Tuple[Any, int, int], None]:
+        return self.client_of(key).dump(key)
+
+    def restore(self, key: str, dump: Tuple[Any, int, int]) -> bool:
+        return self.client_of(key).restore(key, dump)
+
+    def keys(self, like: str = "%") -> Union[List[Tuple[str]], None]:
+        results = self.__fan_out("keys", like)
+
+        keys = [key for result in results if result for key in result]
+        return keys or None
+
+    def keys_prefix(self, prefix: str) -> List[str]:
+        return list(heapq.merge(*self.__fan_out("keys_prefix", prefix)))
+
+    def keys_range(self, start: str = None, end: str = None) -> List[str]:
+        return list(heapq.merge(*self.__fan_out("keys_range", start, end)))
+
+    def keys_glob(self, pattern: str) -> List[str]:
+        return list(heapq.merge(*self.__fan_out("keys_glob", pattern)))
+
+    def count(self, prefix: str = None) -> int:
+        return sum(self.__fan_out("count", prefix))
+
+    def scan(self, prefix: str = None, batch_size: int = 1000) -> Iterator[str]:
+        return heapq.merge(
+            *[client.scan(prefix, batch_size) for client in self.__clients]
+        )
+
+    def iter_items(
+        self, prefix: str = None, batch_size: int = 1000
+    ) -> Iterator[Tuple[str, Any]]:
+        return heapq.merge(
+            *[client.iter_items(prefix, batch_size) for client in self.__clients],
+            key=lambda item: item[0],
+        )
+
+    def flush_pending(self) -> int:
+        return sum(self.__fan_out("flush_pending"))
+
+    def cleanex(self) -> int:
+        return sum(self.__fan_out("cleanex"))
+
+    def flush(self) -> bool:
+        return all(self.__fan_out("flush"))
+
+    def stats(self) -> List[Union[Dict[str, Any], None]]:
+        return [client.stats() for client in self.__clients]
+
+    def add_hook(self, before: Callable = None, after: Callable = None) -> None:
+        for client in self.__clients:
+            client.add_hook(before, after)
+
+    def remove_hook(self, before: Callable = None, after: Callable = None) -> None:
+        for client in self.__clients:
+            client.remove_hook(before, after)
+
+    def cache_info(self) -> List[Union[Dict[str, int], None]]:
+        return [client.cache_info() for client in self.__clients]
+
+    def reaper_info(self) -> List[Union[Dict[str, Union[int, float]], None]]:
+        return [client.reaper_info() for client in self.__clients]
+
+    def close(self, optimize_database: bool = True) -> bool:
+        try:
+            return all(self.__fan_out("close", optimize_database))
+        finally:
+            self.__workers.shutdown(False)
+
+    def __fan_out(self, method: str, *args) -> list:
+        return self.__parallel(
+            [(getattr(client, method), args) for client in self.__clients]
+        )
+
+    def __parallel(self, calls: list) -> list:
+        if len(calls) == 1:
+            function, args = calls[0]
+            return [function(*args)]
+
+        futures = [self.__workers.submit(function, *args) for function, args in calls]
+        return [future.result() for future in futures]
@@ -1,7 +1,14 @@
 import asyncio
+import gc
+import os
+import sqlite3
+import json
+import threading
 import pytest
 import random
 import string
+import time
+import zlib
 import kvsqlite
 
 pytest_plugins = ("pytest_asyncio",)
@@ -184,3 +191,1039 @@ async def test_key_exists():
         for key in keys:
             result = await db.exists(key)
             assert result == True
+
+
+@pytest.mark.asyncio
+async def test_mset_mget_mdelete():
+
+    async with kvsqlite.Client(":memory:") as db:
+        mapping = {
+            random_string(20): random_string(random.randint(1, 20)) for _ in range(2000)
+        }
+
+        assert await db.mset(mapping) == True
+
+        keys = list(mapping) + ["missing-key"]
+        values = await db.mget(keys)
+        assert values[:-1] == list(mapping.values())
+        assert values[-1] is None
+
+        assert await db.msetex({"a": 1, "b": 2}, 60) == True
+        assert await db.mget(["a", "b"]) == [1, 2]
+        assert 0 < await db.ttl("a") <= 60
+
+        assert await db.mdelete(keys) == len(mapping)
+        assert await db.mget(keys[:10]) == [None] * 10
+
+
+def test_sync_mset_mget_mdelete():
+
+    with kvsqlite.sync.Client(":memory:") as db:
+        assert db.mset({"a": 1, "b": [2], "c": "3"}) == True
+        assert db.mget(["c", "b", "a", "d"]) == ["3", [2], 1, None]
+        assert db.mdelete(["a", "b", "d"]) == 2
+        assert db.exists("c") == True
+
+
+@pytest.mark.asyncio
+async def test_positional_loop(tmp_path):
+    loop = asyncio.get_running_loop()
+
+    # loop still follows workers
+    async with kvsqlite.Client(
+        str(tmp_path / "loop.sqlite"),
+        "kvsqlite",
+        True,
+        "WAL",
+        "NORMAL",
+        kvsqlite.PickleEncoder,
+        2,
+        loop,
+    ) as db:
+        assert db.loop is loop
+        assert await db.set("key", "value") == True
+
+
+@pytest.mark.asyncio
+async def test_group_commit_concurrent_set(tmp_path):
+
+    async with kvsqlite.Client(
+        str(tmp_path / "group_commit.sqlite"), group_commit=True
+    ) as db:
+        mapping = {str(i): random_string(random.randint(1, 20)) for i in range(5000)}
+
+        futures = await asyncio.gather(*[db.set(k, v) for k, v in mapping.items()])
+        assert all(result == True for result in futures)
+
+        futures = await asyncio.gather(*[db.delete(k) for k in list(mapping)[:100]])
+        assert all(result == True for result in futures)
+
+        assert await db.get("0") is None
+        assert await db.mget(["4999"]) == [mapping["4999"]]
+
+
+@pytest.mark.asyncio
+async def test_read_pool(tmp_path):
+
+    async with kvsqlite.Client(str(tmp_path / "read_pool.sqlite"), workers=4) as db:
+        await db.mset({str(i): i for i in range(100)})
+
+        results = await asyncio.gather(*[db.get(str(i % 100)) for i in range(10000)])
+        assert results == [i % 100 for i in range(10000)]
+
+        assert await db.set("0", "new") == True
+        assert await db.get("0") == "new"
+        assert await db.exists("0") == True
+
+
+@pytest.mark.asyncio
+async def test_cache():
+
+    async with kvsqlite.Client(":memory:", cache_size=2) as db:
+        assert db.cache_info()["entries"] == 0
+
+        await db.mset({"a": 1, "b": 2, "c": 3})
+        assert await db.get("a") == 1
+        assert await db.get("a") == 1
+        assert await db.mget(["b", "c"]) == [2, 3]
+
+        info = db.cache_info()
+        assert info["hits"] == 1
+        assert info["entries"] == 2
+        assert info["evictions"] == 1
+
+        await db.set("c", 30)
+        assert await db.get("c") == 30
+        await db.rename("c", "d")
+        assert await db.get("c") is None
+        assert await db.get("d") == 30
+        await db.delete("d")
+        assert await db.get("d") is None
+
+        await db.setex("e", 1, 5)
+        assert await db.get("e") == 5
+        await asyncio.sleep(1.1)
+        assert await db.get("e") is None
+
+    with kvsqlite.sync.Client(":memory:") as db:
+        assert db.cache_info() is None
+
+
+@pytest.mark.parametrize("fast_path", [True, False])
+def test_sync_fast_path(tmp_path, fast_path):
+
+    with kvsqlite.sync.Client(
+        str(tmp_path / "fast_path.sqlite"), fast_path=fast_path
+    ) as db:
+        for i in range(1000):
+            assert db.set(str(i), i) == True
+
+        for i in range(1000):
+            assert db.get(str(i)) == i
+
+        assert db.delete("0") == True
+        assert db.exists("0") == False
+        assert len(db.keys()) == 999
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc")
+def test_sync_fast_path_thread_churn(tmp_path):
+
+    with kvsqlite.sync.Client(str(tmp_path / "churn.sqlite")) as db:
+        db.set("key", "value")
+        db.get("key")
+        open_files = len(os.listdir("/proc/self/fd"))
+
+        # Each thread reads on its own connection, closed once the thread exits
+        for _ in range(10):
+            threads = [
+                threading.Thread(target=db.get, args=("key",)) for _ in range(20)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        # join() may return before the thread locals of the last threads are
+        # released, give them a moment
+        deadline = time.monotonic() + 5
+        while (
+            len(os.listdir("/proc/self/fd")) > open_files + 5
+            and time.monotonic() < deadline
+        ):
+            gc.collect()
+            time.sleep(0.05)
+        assert len(os.listdir("/proc/self/fd")) <= open_files + 5
+        assert db.get("key") == "value"
+
+
+@pytest.mark.asyncio
+async def test_scan():
+
+    async with kvsqlite.Client(":memory:") as db:
+        users = {"user:{:04}".format(i): i for i in range(250)}
+        await db.mset(users)
+        await db.mset({"user": -1, "userz": -2, "session:1": -3})
+        await db.setex("user:expired", 1, 0)
+        await asyncio.sleep(1.1)
+
+        assert [key async for key in db.scan("user:", batch_size=100)] == sorted(users)
+        assert [item async for item in db.iter_items("user:", batch_size=50)] == sorted(
+            users.items()
+        )
+
+        keys = [key async for key in db.scan(batch_size=7)]
+        assert keys == sorted(list(users) + ["user", "userz", "session:1"])
+
+        assert [key async for key in db.scan("missing")] == []
+
+
+def test_sync_scan():
+
+    with kvsqlite.sync.Client(":memory:") as db:
+        db.mset({"a": 1, "b\U0010ffff": 2, "b\U0010ffffc": 3, "c": 4})
+
+        assert list(db.scan("b", batch_size=1)) == ["b\U0010ffff", "b\U0010ffffc"]
+        assert list(db.scan("b\U0010ffff")) == ["b\U0010ffff", "b\U0010ffffc"]
+        assert list(db.iter_items(batch_size=2)) == [
+            ("a", 1),
+            ("b\U0010ffff", 2),
+            ("b\U0010ffffc", 3),
+            ("c", 4),
+        ]
+
+
+@pytest.mark.asyncio
+async def test_keys_prefix_range_glob():
+
+    async with kvsqlite.Client(":memory:") as db:
+        await db.mset(
+            {"user:1:name": 1, "user:2:name": 2, "user:2:age": 3, "User:3": 4, "v": 5}
+        )
+        await db.setex("user:3:name", 1, 6)
+        await asyncio.sleep(1.1)
+
+        assert await db.keys_prefix("user:") == [
+            "user:1:name",
+            "user:2:age",
+            "user:2:name",
+        ]
+        assert await db.keys_range("user:2", "v") == ["user:2:age", "user:2:name"]
+        assert await db.keys_range(start="user:2:name") == ["user:2:name", "v"]
+        assert await db.keys_glob("user:*:name") == ["user:1:name", "user:2:name"]
+        assert await db.count("user:") == 3
+        assert await db.count() == 5
+
+
+def test_prefix_queries_use_index(tmp_path):
+    from kvsqlite.sqlite import prefix_end
+
+    assert prefix_end("user:") == "user;"
+    assert prefix_end("") is None
+
+    with kvsqlite.sync.Client(str(tmp_path / "plan.sqlite")) as db:
+        db.set("user:1", 1)
+
+    connection = sqlite3.connect(str(tmp_path / "plan.sqlite"))
+    plan = connection.execute(
+        'EXPLAIN QUERY PLAN SELECT k FROM "kvsqlite" WHERE k >= ? AND k < ?',
+        ("user:", "user;"),
+    ).fetchall()
+    connection.close()
+    assert "SEARCH" in plan[0][-1]
+
+
+@pytest.mark.asyncio
+async def test_reaper(tmp_path):
+
+    async with kvsqlite.Client(
+        str(tmp_path / "reaper.sqlite"), reaper_interval=0.5, reaper_chunk=100
+    ) as db:
+        await db.msetex({str(i): i for i in range(1000)}, 1)
+        await db.set("persistent", True)
+
+        await asyncio.sleep(2)
+
+        info = db.reaper_info()
+        assert info["deleted"] == 1000
+        assert info["runs"] >= 1
+        assert await db.count() == 1
+        assert await db.keys() == [("persistent",)]
+
+    connection = sqlite3.connect(str(tmp_path / "reaper.sqlite"))
+    plan = connection.execute(
+        'EXPLAIN QUERY PLAN DELETE FROM "kvsqlite" WHERE expire_time IS NOT NULL AND expire_time <= ?',
+        (0,),
+    ).fetchall()
+    connection.close()
+    assert "kvsqlite_expire_time" in plan[0][-1]
+
+    with pytest.raises(AssertionError):
+        kvsqlite.sync.Client(
+            str(tmp_path / "reaper.sqlite"), autocommit=False, reaper_interval=1
+        )
+
+
+def test_schema_migration(tmp_path):
+    path = str(tmp_path / "legacy.sqlite")
+
+    connection = sqlite3.connect(path)
+    connection.execute(
+        'CREATE TABLE "kvsqlite" (k VARCHAR(4096) PRIMARY KEY, v BLOB, expire_time INTEGER DEFAULT NULL) WITHOUT ROWID'
+    )
+    connection.execute('CREATE INDEX idx_lookup ON "kvsqlite" (k, expire_time)')
+    connection.commit()
+    connection.close()
+
+    with kvsqlite.sync.Client(path) as db:
+        assert db.set("key", "value") == True
+
+    connection = sqlite3.connect(path)
+    assert connection.execute("PRAGMA user_version").fetchone()[0] >= 1
+    indexes = [
+        row[0]
+        for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"
+        ).fetchall()
+    ]
+    connection.close()
+    assert "idx_lookup" not in indexes
+    assert "kvsqlite_expire_time" in indexes
+
+    with kvsqlite.sync.Client(path) as db:
+        assert db.get("key") == "value"
+
+
+def test_schema_migration_locked(tmp_path):
+    path = str(tmp_path / "locked.sqlite")
+
+    connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute(
+        'CREATE TABLE "kvsqlite" (k VARCHAR(4096) PRIMARY KEY, v BLOB, expire_time INTEGER DEFAULT NULL) WITHOUT ROWID'
+    )
+    connection.execute("BEGIN IMMEDIATE")
+
+    # The migration fails instead of opening on the outdated schema
+    with pytest.raises(sqlite3.OperationalError):
+        kvsqlite.sync.Client(path, pragmas={"busy_timeout": 100})
+
+    # And waits for the lock to be released by default
+    timer = threading.Timer(0.5, connection.execute, ("COMMIT",))
+    timer.start()
+    with kvsqlite.sync.Client(path) as db:
+        assert db.set("key", "value") == True
+    timer.join()
+    connection.close()
+
+    connection = sqlite3.connect(path)
+    assert connection.execute("PRAGMA user_version").fetchone()[0] >= 1
+    connection.close()
+
+
+@pytest.mark.asyncio
+async def test_sharded_client(tmp_path):
+    directory = str(tmp_path / "sharded")
+
+    async with kvsqlite.ShardedClient(directory, shards=3) as db:
+        mapping = {"key:{:03}".format(i): i for i in range(300)}
+        assert await db.mset(mapping) == True
+        assert await db.mget(list(mapping)) == list(mapping.values())
+        assert await db.count("key:") == 300
+        assert await db.keys_prefix("key:") == sorted(mapping)
+        assert [key async for key in db.scan(batch_size=7)] == sorted(mapping)
+
+        shards = {db.shard_of(key) for key in mapping}
+        assert shards == {0, 1, 2}
+
+        source = "key:000"
+        target = next(
+            k for k in ("a", "b", "c", "d") if db.shard_of(k) != db.shard_of(source)
+        )
+        assert await db.rename(source, target) == True
+        assert await db.get(target) == 0
+        assert await db.exists(source) == False
+
+        assert await db.mdelete(list(mapping)) == 299
+        assert await db.flush() == True
+
+    with pytest.raises(AssertionError):
+        kvsqlite.ShardedClient(directory, shards=4)
+
+
+def test_sync_sharded_client(tmp_path):
+    directory = str(tmp_path / "sharded")
+
+    with kvsqlite.sync.ShardedClient(directory, shards=2) as db:
+        db.set("a", 1)
+        db.msetex({"b": 2, "c": 3}, 60)
+        assert db.get("a") == 1
+        assert db.mget(["c", "b", "a"]) == [3, 2, 1]
+        assert list(db.iter_items()) == [("a", 1), ("b", 2), ("c", 3)]
+        assert db.keys_glob("[ab]") == ["a", "b"]
+
+    with kvsqlite.sync.ShardedClient(directory) as db:
+        assert db.shards == 2
+        assert db.get("c") == 3
+
+    # Cross-shard renames copy the stored value, its type tag and expire time
+    with kvsqlite.sync.ShardedClient(
+        str(tmp_path / "typed"), shards=2, default_encoder=kvsqlite.StringEncoder
+    ) as db:
+        source = "counter"
+        target = next(
+            k for k in ("a", "b", "c", "d") if db.shard_of(k) != db.shard_of(source)
+        )
+        db.incr(source)
+        db.expire(source, 60)
+        pttl = db.pttl(source)
+        assert db.rename(source, target) == True
+        assert db.get(target) == 1
+        assert db.incr(target) == 2
+        assert pttl - 100 < db.pttl(target) <= pttl
+        assert db.exists(source) == False
+        assert db.rename(source, target) == False
+
+
+def test_encode_processes(tmp_path):
+
+    with kvsqlite.sync.Client(
+        str(tmp_path / "processes.sqlite"), encode_processes=1, encode_threshold=1024
+    ) as db:
+        large = random_string(4096)
+        assert db.set("large", large) == True
+        assert db.setex("small", 60, "small") == True
+        assert db.mset({"a": large, "b": 1}) == True
+        assert db.mget(["large", "small", "a", "b"]) == [large, "small", large, 1]
+
+        # Containers are measured with their items
+        nested = {"items": [random_string(512) for _ in range(4)], "blob": b"x" * 512}
+        assert kvsqlite.sqlite.sizeof(nested) > 2560
+        assert kvsqlite.sqlite.sizeof(nested, 1024) < 2048
+        assert db.set("nested", nested) == True
+        assert db.get("nested") == nested
+
+
+@pytest.mark.parametrize("codec", ["zlib", "lzma"])
+def test_compressed_encoder(tmp_path, codec):
+    path = str(tmp_path / "compressed.sqlite")
+    value = {"name": "kvsqlite", "tags": ["sqlite", "key-value"] * 200}
+
+    with kvsqlite.sync.Client(path) as db:
+        db.set("legacy", value)
+
+    encoder = kvsqlite.CompressedEncoder(codec=codec, threshold=64)
+    with kvsqlite.sync.Client(path, default_encoder=encoder) as db:
+        assert db.get("legacy") == value
+
+        db.set("compressed", value)
+        db.set("small", 1)
+        assert db.get("compressed") == value
+        assert db.get("small") == 1
+
+    connection = sqlite3.connect(path)
+    compressed, small = [
+        row[0]
+        for row in connection.execute(
+            "SELECT v FROM kvsqlite WHERE k IN ('compressed', 'small') ORDER BY k"
+        )
+    ]
+    connection.close()
+    assert compressed[0] == encoder.tag
+    assert len(compressed) < len(kvsqlite.PickleEncoder().encode(value))
+    assert small[0] == kvsqlite.CompressedEncoder.RAW
+
+
+def test_compressed_encoder_dictionary():
+    value = {"user": "aymen", "email": "aymen@example.com", "active": True}
+    dictionary = bytes(kvsqlite.PickleEncoder().encode(value))
+    encoder = kvsqlite.CompressedEncoder(threshold=0, dictionary=dictionary)
+
+    encoded = encoder.encode(value)
+    assert encoded[0] == kvsqlite.CompressedEncoder.ZLIB_DICTIONARY
+    assert len(encoded) < len(zlib.compress(dictionary))
+    assert encoder.decode(bytes(encoded)) == value
+
+
+def test_encoders(tmp_path):
+    path = str(tmp_path / "encoders.sqlite")
+
+    with kvsqlite.sync.Client(path, default_encoder=kvsqlite.StringEncoder) as db:
+        assert db.set("text", "مرحبا kvsqlite") == True
+        assert db.get("text") == "مرحبا kvsqlite"
+
+    with kvsqlite.sync.Client(path, default_encoder=kvsqlite.BytesEncoder) as db:
+        assert db.set("bytes", b"\x00\x01") == True
+        assert db.set("bytearray", bytearray(b"\x02")) == True
+        assert db.set("memoryview", memoryview(b"\x03")) == True
+        assert db.mget(["bytes", "bytearray", "memoryview"]) == [
+            b"\x00\x01",
+            b"\x02",
+            b"\x03",
+        ]
+
+    value = {"name": "kvsqlite", "tags": ["sqlite"], "stars": 1, "ok": True}
+    with kvsqlite.sync.Client(path, default_encoder=kvsqlite.JSONEncoder) as db:
+        assert db.set("json", value) == True
+        assert db.get("json") == value
+
+    connection = sqlite3.connect(path)
+    (stored,) = connection.execute("SELECT v FROM kvsqlite WHERE k = 'json'").fetchone()
+    connection.close()
+    assert json.loads(stored) == value
+
+
+def test_typed_values(tmp_path):
+    path = str(tmp_path / "typed.sqlite")
+    value = {"name": "kvsqlite"}
+
+    with kvsqlite.sync.Client(path) as db:
+        assert db.set("counter", 1, encoder=kvsqlite.NativeEncoder) == True
+        assert db.setex("name", 60, "kvsqlite", encoder=kvsqlite.NativeEncoder) == True
+        assert db.mset({"blob": b"\x00", "float": 0.5}, encoder=kvsqlite.NativeEncoder)
+        assert db.msetex({"json": value}, 60, encoder=kvsqlite.JSONEncoder) == True
+        assert db.set("pickled", value) == True
+
+        assert db.mget(["counter", "name", "blob", "float", "json", "pickled"]) == [
+            1,
+            "kvsqlite",
+            b"\x00",
+            0.5,
+            value,
+            value,
+        ]
+        assert list(db.iter_items("c")) == [("counter", 1)]
+
+        with pytest.raises(AssertionError):
+            db.set("bool", True, encoder=kvsqlite.NativeEncoder)
+        with pytest.raises(AssertionError):
+            db.set("compressed", value, encoder=kvsqlite.CompressedEncoder())
+
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "INSERT INTO kvsqlite (k, v) VALUES ('legacy', ?)",
+        (kvsqlite.StringEncoder().encode("legacy"),),
+    )
+    connection.commit()
+    assert connection.execute(
+        "SELECT typeof(v), t FROM kvsqlite WHERE k IN ('counter', 'name') ORDER BY k"
+    ).fetchall() == [("integer", 1), ("text", 1)]
+    connection.close()
+
+    # Tagged values are decoded with their encoder, untagged ones with the default encoder
+    with kvsqlite.sync.Client(path, default_encoder=kvsqlite.StringEncoder) as db:
+        assert db.get("pickled") == value
+        assert db.get("counter") == 1
+        assert db.get("legacy") == "legacy"
+
+
+@pytest.mark.asyncio
+async def test_incr(tmp_path):
+
+    async with kvsqlite.Client(str(tmp_path / "incr.sqlite"), workers=4) as db:
+        await asyncio.gather(*[db.incr("counter") for _ in range(200)])
+        assert await db.get("counter") == 200
+        assert await db.decr("counter", 50) == 150
+        assert await db.incrbyfloat("counter", 0.5) == 150.5
+
+        await db.setex("limit", 1, 5)
+        assert await db.incr("limit") == 6
+        assert await db.ttl("limit") > 0
+        await asyncio.sleep(1.1)
+        assert await db.incr("limit") == 1
+        assert await db.ttl("limit") == 0
+
+        await db.set("text", "kvsqlite")
+        with pytest.raises(TypeError):
+            await db.incr("text")
+
+
+def test_sync_incr(tmp_path):
+    path = str(tmp_path / "incr.sqlite")
+
+    with kvsqlite.sync.Client(path, cache_size=10) as db:
+        assert db.incr("counter", 2) == 2
+        assert db.get("counter") == 2
+        assert db.incr("counter") == 3
+        assert db.get("counter") == 3
+
+        # An expired encoded value is replaced by a native counter
+        db.setex("limit", 1, 5, encoder=kvsqlite.PickleEncoder())
+        time.sleep(1.1)
+        assert db.incr("limit") == 1
+        assert db.get("limit") == 1
+        assert db.incr("limit") == 2
+
+    connection = sqlite3.connect(path)
+    for key in ("counter", "limit"):
+        assert connection.execute(
+            "SELECT typeof(v), t FROM kvsqlite WHERE k = ?", (key,)
+        ).fetchone() == ("integer", kvsqlite.NativeEncoder.type_tag)
+    connection.close()
+
+
+@pytest.mark.asyncio
+async def test_setnx_getset_getdel_cas(tmp_path):
+
+    async with kvsqlite.Client(str(tmp_path / "cas.sqlite"), workers=4) as db:
+        results = await asyncio.gather(*[db.setnx("lock", i, 1) for i in range(20)])
+        assert results.count(True) == 1
+        assert await db.ttl("lock") > 0
+
+        await asyncio.sleep(1.1)
+        assert await db.setnx("lock", "again") == True
+        assert await db.setnx("lock", "taken") == False
+
+        await db.setex("session", 60, {"user": 1})
+        assert await db.getset("session", {"user": 2}) == {"user": 1}
+        assert await db.ttl("session") == 0
+        assert await db.getset("missing", 1) is None
+        assert await db.get("missing") == 1
+
+        assert await db.getdel("session") == {"user": 2}
+        assert await db.getdel("session") is None
+        assert await db.exists("session") == False
+
+        await db.set("version", 1, encoder=kvsqlite.NativeEncoder)
+        assert await db.cas("version", 1, 2) == False
+        assert await db.cas("version", 1, 2, encoder=kvsqlite.NativeEncoder) == True
+        assert await db.cas("version", 1, 3, encoder=kvsqlite.NativeEncoder) == False
+        assert await db.get("version") == 2
+
+        await db.set("config", ["a"])
+        assert await db.cas("config", ["a"], ["b"]) == True
+        assert await db.get("config") == ["b"]
+
+
+def test_sync_getset_without_autocommit(tmp_path):
+
+    with kvsqlite.sync.Client(str(tmp_path / "cas.sqlite"), autocommit=False) as db:
+        assert db.setnx("key", 1) == True
+        assert db.getset("key", 2) == 1
+        assert db.getdel("key") == 2
+        assert db.commit() == True
+        assert db.get("key") is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("group_commit", [False, True])
+async def test_queue_engine(tmp_path, group_commit):
+
+    async with kvsqlite.Client(
+        str(tmp_path / "queue.sqlite"), queue_engine=True, group_commit=group_commit
+    ) as db:
+        keys = [(random_string(10), random_string(10)) for _ in range(2000)]
+
+        assert all(await asyncio.gather(*[db.set(k, v) for k, v in keys]))
+        assert await asyncio.gather(*[db.get(k) for k, _ in keys]) == [
+            v for _, v in keys
+        ]
+
+        await db.set("text", "kvsqlite")
+        with pytest.raises(TypeError):
+            await db.incr("text")
+        assert await db.count() == 2001
+
+
+def test_write_behind(tmp_path):
+    path = str(tmp_path / "write_behind.sqlite")
+
+    def stored(key):
+        connection = sqlite3.connect(path)
+        row = connection.execute(
+            "SELECT v FROM kvsqlite WHERE k = ?", (key,)
+        ).fetchone()
+        connection.close()
+        return row
+
+    with kvsqlite.sync.Client(path, write_behind=True, write_behind_delay=60) as db:
+        for i in range(100):
+            assert db.set("session", i) == True
+        assert db.setex("temporary", 60, "value") == True
+        assert db.get("session") == 99
+        assert stored("session") is None
+
+        assert db.flush_pending() == 2
+        assert db.flush_pending() == 0
+        assert db.get("session") == 99
+        assert stored("session") is not None
+
+        db.delete("session")
+        assert db.get("session") is None
+        assert stored("session") is not None
+
+        # Other requests see the buffered writes
+        db.set("counter", 1)
+        assert db.count() == 2
+        assert stored("session") is None
+
+        db.set("last", "value")
+
+    assert stored("last") is not None
+
+    # Nothing is ever pending without write-behind
+    with kvsqlite.sync.Client(path) as db:
+        assert db.flush_pending() == 0
+
+    with kvsqlite.sync.ShardedClient(str(tmp_path / "sharded"), shards=2) as db:
+        assert db.flush_pending() == 0
+
+
+@pytest.mark.asyncio
+async def test_async_write_behind(tmp_path):
+    path = str(tmp_path / "write_behind.sqlite")
+
+    async with kvsqlite.Client(path, write_behind=True, write_behind_size=100) as db:
+        assert all(await asyncio.gather(*[db.set(str(i), i) for i in range(1000)]))
+        assert await db.get("999") == 999
+
+    async with kvsqlite.Client(path) as db:
+        assert await db.count() == 1000
+        assert await db.flush_pending() == 0
+
+    # Values are encoded by the workers, not on the event loop
+    class ThreadRecordingEncoder(kvsqlite.PickleEncoder):
+        threads = set()
+
+        def encode(self, obj):
+            self.threads.add(threading.get_ident())
+            return super().encode(obj)
+
+    async with kvsqlite.Client(
+        path, default_encoder=ThreadRecordingEncoder, write_behind=True
+    ) as db:
+        await db.set("object", {"a": 1})
+        await db.setex("expiring", 60, {"b": 2})
+        assert await db.get("object") == {"a": 1}
+
+    assert ThreadRecordingEncoder.threads
+    assert threading.get_ident() not in ThreadRecordingEncoder.threads
+
+
+def test_pragmas(tmp_path):
+    path = str(tmp_path / "pragmas.sqlite")
+
+    with kvsqlite.sync.Client(path) as db:
+        db.mset({str(i): i for i in range(100)})
+
+    with kvsqlite.sync.Client(
+        path, pragmas={"page_size": 8192, "mmap_size": 1048576, "busy_timeout": 100}
+    ) as db:
+        assert db.get("99") == 99
+
+    connection = sqlite3.connect(path)
+    assert connection.execute("PRAGMA page_size").fetchone()[0] == 8192
+    assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    connection.close()
+
+    with kvsqlite.sync.Client(path, pragmas="read-heavy") as db:
+        assert db.count() == 100
+
+    with pytest.raises(AssertionError):
+        kvsqlite.sync.Client(path, pragmas={"page_size": 1000})
+    with pytest.raises(AssertionError):
+        kvsqlite.sync.Client(path, pragmas={"foreign_keys": 1})
+    with pytest.raises(AssertionError):
+        kvsqlite.sync.Client(path, pragmas="unknown")
+
+
+@pytest.mark.asyncio
+async def test_metrics(tmp_path):
+
+    async with kvsqlite.Client(str(tmp_path / "metrics.sqlite"), metrics=True) as db:
+        await asyncio.gather(*[db.set(str(i), i) for i in range(100)])
+        await asyncio.gather(*[db.get(str(i)) for i in range(100)])
+        await db.set("text", "value")
+        with pytest.raises(TypeError):
+            await db.incr("text")
+
+        stats = db.stats()
+        assert stats["queued"] == 0
+
+        gets = stats["requests"]["GET"]
+        assert gets["count"] == 100
+        assert gets["errors"] == 0
+        assert set(gets["phases"]) == {"queue", "sql", "codec", "total"}
+        assert gets["phases"]["total"]["buckets"][float("inf")] == 100
+        assert gets["phases"]["total"]["p99"] <= gets["phases"]["total"]["max"]
+
+        assert "lock" in stats["requests"]["SET"]["phases"]
+        assert stats["requests"]["INCR"]["errors"] == 1
+
+        text = kvsqlite.metrics.to_prometheus(stats)
+        assert 'kvsqlite_requests_total{request="GET"} 100' in text
+        assert (
+            'kvsqlite_request_duration_seconds_count{request="GET",phase="total"} 100'
+            in text
+        )
+
+    async with kvsqlite.Client(str(tmp_path / "metrics.sqlite")) as db:
+        assert db.stats() is None
+
+
+def test_slow_log_and_hooks(tmp_path, caplog):
+    path = str(tmp_path / "slow.sqlite")
+    calls = []
+
+    def before(request, key):
+        calls.append(("before", request, key))
+        return "span"
+
+    def after(request, key, context, duration, exception):
+        calls.append(("after", request, key, context, type(exception)))
+
+    def broken(request, key):
+        raise ValueError("broken hook")
+
+    with kvsqlite.sync.Client(path, slow_threshold=0, trace=True) as db:
+        db.add_hook(before, after)
+        db.add_hook(broken)
+
+        with caplog.at_level("WARNING", logger="kvsqlite.sqlite"):
+            db.set("secret", "value")
+            assert db.get("secret") == "value"
+            with pytest.raises(TypeError):
+                db.incr("secret")
+
+        assert calls[:3] == [
+            ("before", "SET", "secret"),
+            ("after", "SET", "secret", "span", type(None)),
+            ("before", "GET", "secret"),
+        ]
+        assert calls[-1] == ("after", "INCR", "secret", "span", TypeError)
+        assert "Slow GET request, key=secret" in caplog.text
+        assert "SELECT v, expire_time, t FROM" in caplog.text
+        assert "plan: SEARCH" in caplog.text
+        assert "broken hook" in caplog.text
+
+        db.remove_hook(before, after)
+        db.remove_hook(broken)
+        calls.clear()
+        db.get("secret")
+        assert calls == []
+
+    caplog.clear()
+    with kvsqlite.sync.Client(
+        path, slow_threshold=0, redact_keys=True, trace=True
+    ) as db:
+        with caplog.at_level("WARNING", logger="kvsqlite.sqlite"):
+            db.get("secret")
+            db.mget(["secret", "other"])
+
+        assert "secret" not in caplog.text
+        assert "key=<redacted>" in caplog.text
+        assert "key=<2 keys>" in caplog.text
+        assert "WHERE k = ?" in caplog.text
+
+
+def test_millisecond_ttl(tmp_path):
+    path = str(tmp_path / "ttl.sqlite")
+
+    # A schema version 2 database, with float seconds expire times
+    connection = sqlite3.connect(path)
+    connection.execute(
+        'CREATE TABLE "kvsqlite" (k VARCHAR(4096) PRIMARY KEY, v BLOB, expire_time INTEGER DEFAULT NULL, t INTEGER DEFAULT NULL) WITHOUT ROWID'
+    )
+    connection.executemany(
+        'INSERT INTO "kvsqlite" VALUES (?, ?, ?, 3)',
+        [
+            ("live", "value", time.time() + 60.5),
+            ("expired", "value", time.time() - 1.5),
+            ("persistent", "value", None),
+        ],
+    )
+    connection.execute("PRAGMA user_version = 2")
+    connection.commit()
+    connection.close()
+
+    with kvsqlite.sync.Client(path) as db:
+        assert db.get("live") == "value"
+        assert db.get("expired") is None
+        assert db.get("persistent") == "value"
+        assert 59000 < db.pttl("live") <= 60500
+        assert 59 < db.ttl("live") <= 60.5
+        assert db.pttl("persistent") == 0
+
+        assert db.setex("short", 60, "value")
+        assert isinstance(db.pttl("short"), int)
+
+        assert db.expire_at("persistent", time.time() + 120)
+        # The engine clock may lead time.time() by a millisecond
+        assert 119000 < db.pttl("persistent") <= 120001
+        assert db.expire_at("persistent", time.time() - 1)
+        assert db.get("persistent") is None
+        assert db.expire_at("missing", time.time() + 60) == False
+
+    connection = sqlite3.connect(path)
+    assert connection.execute("PRAGMA user_version").fetchone()[0] == 3
+    assert connection.execute(
+        'SELECT typeof(expire_time) FROM "kvsqlite" WHERE k = ?', ("live",)
+    ).fetchone() == ("integer",)
+    connection.close()
+
+
+def test_lazy_expiry(tmp_path):
+    path = str(tmp_path / "lazy.sqlite")
+
+    with kvsqlite.sync.Client(path) as db:
+        db.setex("expired", 60, "value")
+        db.expire_at("expired", time.time() - 1)
+        assert db.exists("expired") == False
+        assert db.get("expired") is None
+
+    with kvsqlite.sync.Client(path, lazy_expiry=True, metrics=True) as db:
+        db.mset({"live": 1, "other": 2})
+        db.setex("rewritten", 60, "value")
+        db.expire_at("rewritten", time.time() - 1)
+
+        assert db.get("expired") is None
+        assert db.exists("rewritten") == False
+        assert db.exists("live") == True
+        assert db.get("live") == 1
+        assert "lazy_expiry_pending" in db.stats()
+
+    connection = sqlite3.connect(path)
+    keys = [row[0] for row in connection.execute('SELECT k FROM "kvsqlite"')]
+    connection.close()
+    assert sorted(keys) == ["live", "other"]
+
+    with pytest.raises(AssertionError):
+        kvsqlite.sync.Client(path, autocommit=False, lazy_expiry=True)
+
+
+async def read_reply(reader):
+    line = await reader.readline()
+    kind, data = line[:1], line[1:-2]
+    if kind == b"+":
+        return data.decode()
+    elif kind == b"-":
+        return Exception(data.decode())
+    elif kind == b":":
+        return int(data)
+    elif kind == b"$":
+        if int(data) < 0:
+            return None
+        return (await reader.readexactly(int(data) + 2))[:-2]
+    elif kind == b"*":
+        return [await read_reply(reader) for _ in range(int(data))]
+
+
+def resp_command(*arguments):
+    arguments = [
+        argument if isinstance(argument, bytes) else str(argument).encode()
+        for argument in arguments
+    ]
+    return b"*%d\r\n" % len(arguments) + b"".join(
+        b"$%d\r\n%s\r\n" % (len(argument), argument) for argument in arguments
+    )
+
+
+@pytest.mark.asyncio
+async def test_server(tmp_path):
+    from kvsqlite.server import Server
+
+    path = str(tmp_path / "server.sqlite")
+
+    # Values written by other encoders are still replied as bulk strings
+    with kvsqlite.sync.Client(path, default_encoder=kvsqlite.NativeEncoder) as db:
+        db.set("native", 5)
+        db.set("pickled", [1, 2], encoder=kvsqlite.PickleEncoder)
+
+    server = Server(path, port=0)
+    listener = await server.start()
+    port = listener.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+        # Pipelined commands are processed in one batch, replies keep their order
+        commands = [
+            ("PING",),
+            ("SET", "a", b"\x00binary"),
+            ("SET", "b", "2", "EX", "60"),
+            ("SET", "a", "x", "NX"),
+            ("GET", "a"),
+            ("GET", "missing"),
+            ("MSET", "c", "3", "d", "4"),
+            ("MGET", "a", "c", "missing"),
+            ("EXISTS", "a", "b", "missing"),
+            ("TTL", "b"),
+            ("TTL", "a"),
+            ("TTL", "missing"),
+            ("EXPIRE", "a", "100"),
+            ("RENAME", "d", "e"),
+            ("RENAME", "missing", "f"),
+            ("RENAME", "e", "c"),
+            ("GET", "c"),
+            ("RENAME", "c", "e"),
+            ("KEYS", "*"),
+            ("DEL", "e", "missing"),
+            ("SETEX", "g", "0", "value"),
+            ("INCRBY", "a", "1"),
+            ("GET",),
+        ]
+        writer.write(b"".join(resp_command(*command) for command in commands))
+        replies = [await read_reply(reader) for _ in commands]
+
+        assert replies[:9] == [
+            "PONG",
+            "OK",
+            "OK",
+            None,
+            b"\x00binary",
+            None,
+            "OK",
+            [b"\x00binary", b"3", None],
+            2,
+        ]
+        assert 59 <= replies[9] <= 60
+        assert replies[10:12] == [-1, -2]
+        assert replies[12:14] == [1, "OK"]
+        assert str(replies[14]) == "ERR no such key"
+        assert replies[15:18] == ["OK", b"4", "OK"]
+        assert replies[18] == [b"a", b"b", b"e", b"native", b"pickled"]
+        assert replies[19] == 1
+        assert str(replies[20]) == "ERR invalid expire time in 'setex' command"
+        assert str(replies[21]) == "ERR unknown command 'INCRBY'"
+        assert str(replies[22]) == "ERR wrong number of arguments for 'get' command"
+
+        writer.write(
+            resp_command("GET", "native") + resp_command("MGET", "native", "pickled")
+        )
+        assert await read_reply(reader) == b"5"
+        assert await read_reply(reader) == [b"5", b"[1, 2]"]
+
+        writer.write(b"".join(resp_command("SET", "key:%d" % i, i) for i in range(25)))
+        for _ in range(25):
+            await read_reply(reader)
+
+        # Cursors can be continued on another connection, like with pooled clients
+        other_reader, other_writer = await asyncio.open_connection("127.0.0.1", port)
+        connections = [(reader, writer), (other_reader, other_writer)]
+        cursor, keys = "0", []
+        while True:
+            connection_reader, connection_writer = connections[len(keys) // 10 % 2]
+            connection_writer.write(
+                resp_command("SCAN", cursor, "MATCH", "key:*", "COUNT", 10)
+            )
+            cursor, page = await read_reply(connection_reader)
+            keys.extend(page)
+            if cursor == b"0":
+                break
+            cursor = cursor.decode()
+        assert sorted(keys) == sorted(b"key:%d" % i for i in range(25))
+        other_writer.close()
+
+        writer.write(resp_command("SCAN", "12345"))
+        assert str(await read_reply(reader)) == "ERR invalid cursor"
+
+        # Inline commands
+        writer.write(b"EXISTS key:1\r\nQUIT\r\n")
+        assert await read_reply(reader) == 1
+        assert await read_reply(reader) == "OK"
+        assert await reader.read() == b""
+        writer.close()
+    finally:
+        await server.close()
+
+    async with kvsqlite.Client(path, default_encoder=kvsqlite.BytesEncoder) as db:
+        assert await db.get("a") == b"\x00binary"